@@ -1,6 +1,9 @@
 from pathlib import Path
 from datetime import timedelta
+import importlib.util
 import os
+import django
+from django.core.exceptions import ImproperlyConfigured
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -28,6 +31,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'fastfood_app.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -40,7 +44,7 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'fastfood_app.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
@@ -81,7 +85,7 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_LIFETIME": timedelta(days=1),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=10),
 
-    "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
+    "TOKEN_OBTAIN_SERIALIZER": "fastfood_app.serializers.RoleTokenObtainPairSerializer",
     "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
@@ -111,13 +115,57 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'conf.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=postgres needs psycopg (pip install "psycopg[binary,pool]"); DB_POOL=1 needs Django 5.1+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60)) # seconds a connection is reused, 0 closes it after each request
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'fastfood'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
+    if os.environ.get('DB_POOL'):
+        if django.VERSION < (5, 1):
+            raise ImproperlyConfigured('DB_POOL needs Django 5.1+; use DB_CONN_MAX_AGE or PgBouncer instead')
+        # the pool replaces persistent connections, Django refuses both at once
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        }}
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'fastfood_app.backends.sqlite3', # WAL pragmas and BEGIN IMMEDIATE
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        }
+    }
+else:
+    raise ImproperlyConfigured(f'DB_ENGINE must be sqlite or postgres, not {DB_ENGINE!r}')
+
+SQLITE_PRAGMAS = { # applied to every new SQLite connection
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)), # ms a writer waits for the lock
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'), # safe with WAL, fsyncs only at checkpoints
 }
 
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher', # older accounts, rehashed with the first hasher on their next login
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+if importlib.util.find_spec('argon2') is not None:
+    PASSWORD_HASHERS.insert(0, 'django.contrib.auth.hashers.Argon2PasswordHasher')
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -158,3 +206,34 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 AUTH_USER_MODEL = 'fastfood_app.User'
 
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 10000
+
+EXCHANGE_RATES = {'som': 1, 'usd': 12348.14, 'rubl': 135.46} # so'm per unit, overridden by ExchangeRate rows
+
+IMAGE_WIDTHS = (320, 640, 1024) # responsive variants of food images, in px
+IMAGE_THUMBNAIL_SIZE = 160 # square thumbnail side, in px
+IMAGE_WORKERS = 2 # threads resizing uploaded images
+
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 10 # seconds, doubled after every failed attempt
+JOB_TIMEOUT = 300 # seconds before a running job of a dead worker is picked up again
+
+EVENTS_BACKEND = 'fastfood_app.events.InProcessBroker' # pub/sub behind the order event streams
+EVENTS_HEARTBEAT = 15 # seconds between keep-alive comments on idle streams
+
+JWT_USER_CACHE_SIZE = 1024 # users kept by CachedJWTAuthentication
+JWT_USER_CACHE_TTL = 60 # seconds; bounds staleness of users changed in another process
+JWT_ROLE_CLAIM = False # put the user's role in new tokens so permission checks read it from the token
+
+METRICS_SAMPLE_RATE = 0.1 # share of requests whose SQL queries are counted and timed
+METRICS_SERVER_TIMING = DEBUG # add a Server-Timing header to sampled responses
+METRICS_TOKEN = None # bearer token letting Prometheus read metrics/; admins can always read it
+
+# p50/p95/p99 in ms and minimum rps per step, checked by benchmark_orders at its default concurrency of 1, as CI runs it;
+# measured 4-6x lower on SQLite. With more lifecycles in flight SQLite writers queue for its lock, so pass --budget too.
+BENCHMARK_BUDGETS = {
+    'create': {'p95': 50},
+    'accept': {'p95': 25},
+    'on_the_way': {'p95': 30},
+    'deliver': {'p95': 30},
+    'report': {'p95': 25},
+}
@@ -1,28 +1,54 @@
 from django.contrib import admin
-from .models import User, Image, Rate, Food, Order, Delivered
+from .images import schedule_image_processing
+from .models import User, Image, Rate, Food, Order, Delivered, KitchenSlot, SalesRollup, ExchangeRate, Job
 
 class UserAdmin(admin.ModelAdmin):
     list_display = ('username', 'role', 'tel_number', 'address')
 
 class ImageAdmin(admin.ModelAdmin):
-    list_display = ('id', 'date')
+    list_display = ('id', 'content_hash', 'date')
+
+    def save_model(self, request, obj, form, change):
+        changed = 'image' in form.changed_data
+        if changed:
+            obj.content_hash, obj.variants = None, {}
+        super().save_model(request, obj, form, change)
+        if changed:
+            schedule_image_processing([obj.id])
 
 class RateAdmin(admin.ModelAdmin):
-    list_display = ('rate', 'user')
+    list_display = ('rate', 'user', 'food')
 
 class FoodAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'valyuta', 'overal_rating', 'overal_rated_users')
-    filter_horizontal = ('image', 'ratings')
+    list_display = ('name', 'price', 'valyuta', 'price_in_som', 'overal_rating', 'overal_rated_users')
+    filter_horizontal = ('image',)
 
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('user', 'food', 'count', 'address_lat_a', 'address_long_a', 'estimate_date', 'assigned_officiant', 'delivered', 'food_on_the_way', 'date')
+    list_display = ('user', 'food', 'count', 'address_lat_a', 'address_long_a', 'estimate_date', 'ready_at', 'assigned_officiant', 'delivered', 'food_on_the_way', 'date')
 
 class DeliveredAdmin(admin.ModelAdmin):
     list_display = ('responsible', 'food', 'sold_number', 'total_income', 'date')
 
+class KitchenSlotAdmin(admin.ModelAdmin):
+    list_display = ('slot', 'dishes')
+
+class SalesRollupAdmin(admin.ModelAdmin):
+    list_display = ('period', 'period_start', 'responsible', 'food', 'sold_number', 'total_income')
+
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ('valyuta', 'rate', 'date')
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'key', 'status', 'attempts', 'run_at', 'date')
+    list_filter = ('status', 'name')
+
 admin.site.register(User, UserAdmin)
 admin.site.register(Image, ImageAdmin)
 admin.site.register(Rate, RateAdmin)
 admin.site.register(Food, FoodAdmin)
 admin.site.register(Order, OrderAdmin)
 admin.site.register(Delivered, DeliveredAdmin)
+admin.site.register(KitchenSlot, KitchenSlotAdmin)
+admin.site.register(SalesRollup, SalesRollupAdmin)
+admin.site.register(ExchangeRate, ExchangeRateAdmin)
+admin.site.register(Job, JobAdmin)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FastfoodAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fastfood_app'
+
+    def ready(self):
+        from . import metrics, signals, tasks  # noqa: F401
@@ -0,0 +1,137 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from .authentication import AsyncJWTAuthentication
+from .calculations import get_foods_near
+from .filters import filter_foods_by_price, parse_near
+from .menu import aget_menu_version, aget_menu_bytes, get_menu_etag
+from .models import Food, Order
+from .pagination import DateCursorPagination, OldestFirstCursorPagination
+from .serializers import FoodListSerializer, ListUserOrderSerializer, OfitsiantOrderSerializer
+from .views import IsAdminOrOfitsiantUser
+
+
+class AsyncAPIView(View):
+    """
+    Async counterpart of APIView for read endpoints: JWT authentication, permission classes and JSON rendering.
+    """
+    authentication_class = AsyncJWTAuthentication
+    permission_classes = [IsAuthenticated]
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.query_params = request.GET
+        try:
+            await self.initial(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as e:
+            return self.handle_exception(request, e)
+
+    async def initial(self, request):
+        authentication = self.authentication_class()
+        result = await authentication.aauthenticate(request)
+        request.user, request.auth = result if result else (AnonymousUser(), None)
+        for permission in self.permission_classes:
+            permission = permission()
+            if not permission.has_permission(request, self):
+                if request.auth is None:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+
+    def handle_exception(self, request, exc):
+        data = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            response = self.render(data, status.HTTP_401_UNAUTHORIZED)
+            response['WWW-Authenticate'] = self.authentication_class().authenticate_header(request)
+            return response
+        return self.render(data, exc.status_code)
+
+    def render(self, data, status_code=status.HTTP_200_OK):
+        return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+    async def list(self, request, queryset, serializer_class, paginator):
+        page = await paginator.apaginate_queryset(queryset, request, self)
+        if page is not None:
+            return self.render(paginator.get_paginated_data(serializer_class(page, many=True).data))
+        return self.render(serializer_class([item async for item in queryset], many=True).data)
+
+
+class AsyncFoodListView(AsyncAPIView):
+    """
+    Async FoodListAPIView.
+    """
+    async def get(self, request):
+        if request.GET.get('near'):
+            return await self.get_near(request)
+        foods = Food.objects.prefetch_related('image')
+        try:
+            foods = filter_foods_by_price(foods, request.GET)
+        except ValueError:
+            return self.render({"message": "min_price and max_price must be numbers in so'm"}, status.HTTP_400_BAD_REQUEST)
+        paginator = OldestFirstCursorPagination()
+        page = await paginator.apaginate_queryset(foods, request, self)
+        if page is not None:
+            return self.render(paginator.get_paginated_data(FoodListSerializer(page, many=True).data))
+        if foods.query.where or foods.query.order_by:
+            return self.render(FoodListSerializer([food async for food in foods], many=True).data)
+        return await self.get_cached(request)
+
+    async def get_cached(self, request):
+        version = await aget_menu_version()
+        etag = get_menu_etag(version)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(await aget_menu_bytes(version), content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    async def get_near(self, request):
+        try:
+            lat, long, radius_km = parse_near(request.GET)
+        except ValueError as e:
+            return self.render({"message": str(e)}, status.HTTP_400_BAD_REQUEST)
+        foods = await sync_to_async(get_foods_near)(lat, long, radius_km, Food.objects.prefetch_related('image'))
+        data = FoodListSerializer([food for food, _ in foods], many=True).data
+        for item, (_, distance) in zip(data, foods):
+            item['distance_km'] = round(distance, 3)
+        return self.render(data)
+
+
+class AsyncUserOrdersView(AsyncAPIView):
+    """
+    Async UserOrdersAPIView.
+    """
+    async def get(self, request):
+        orders = Order.objects.filter(user=request.user).select_related('food').prefetch_related('food__image')
+        return await self.list(request, orders, ListUserOrderSerializer, DateCursorPagination())
+
+
+class AsyncOfitsiantOrderListView(AsyncAPIView):
+    """
+    Async OfitsiantOrderListAPIView.
+    """
+    permission_classes = [IsAuthenticated, IsAdminOrOfitsiantUser]
+
+    async def get(self, request):
+        orders = (Order.objects.filter(assigned_officiant__isnull=True, delivered=False)
+                  .select_related('food').prefetch_related('food__image'))
+        return await self.list(request, orders, OfitsiantOrderSerializer, OldestFirstCursorPagination())
+
+
+class AsyncOfitsiantOrderAssignedListView(AsyncAPIView):
+    """
+    Async OfitsiantOrderAssignedListAPIView.
+    """
+    permission_classes = [IsAuthenticated, IsAdminOrOfitsiantUser]
+
+    async def get(self, request):
+        orders = (Order.objects.filter(assigned_officiant=request.user, delivered=False)
+                  .select_related('food').prefetch_related('food__image'))
+        return await self.list(request, orders, OfitsiantOrderSerializer, OldestFirstCursorPagination())
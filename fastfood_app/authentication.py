@@ -0,0 +1,159 @@
+import threading
+import time
+from collections import OrderedDict
+from copy import copy
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework.authentication import BaseAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+ROLE_CLAIM = 'role'
+METRICS_AUTH = 'metrics'
+
+
+class UserCache:
+    """
+    LRU of users by token user id. Entries expire after JWT_USER_CACHE_TTL seconds,
+    and every hit returns a copy so requests never share an instance.
+    """
+    def __init__(self):
+        self.users = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.users.get(user_id)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self.users[user_id]
+                return None
+            self.users.move_to_end(user_id)
+        return copy(user)
+
+    def set(self, user_id, user):
+        with self.lock:
+            self.users[user_id] = (copy(user), time.monotonic() + settings.JWT_USER_CACHE_TTL)
+            self.users.move_to_end(user_id)
+            while len(self.users) > settings.JWT_USER_CACHE_SIZE:
+                self.users.popitem(last=False)
+
+    def discard(self, user_id):
+        with self.lock:
+            self.users.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.users.clear()
+
+
+user_cache = UserCache()
+
+
+def get_request_role(request):
+    """
+    Role of the request from the token's role claim, falling back to the user.
+    """
+    auth = getattr(request, 'auth', None)
+    role = auth.get(ROLE_CLAIM) if auth is not None and hasattr(auth, 'get') else None
+    return role or getattr(request.user, 'role', None)
+
+
+class RoleRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the user's role when JWT_ROLE_CLAIM is on; access tokens made from it copy the claim.
+    """
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        if settings.JWT_ROLE_CLAIM:
+            token[ROLE_CLAIM] = user.role
+        return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication resolving users through the process user cache, so most requests do not query the User table.
+    """
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user)
+        else:
+            self.check_user(user, validated_token)
+        self.check_role(user, validated_token)
+        return user
+
+    def check_user(self, user, validated_token):
+        """
+        Checks JWTAuthentication.get_user makes on a freshly loaded user, repeated for cached ones.
+        """
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+    def check_role(self, user, validated_token):
+        role = validated_token.get(ROLE_CLAIM)
+        if role is not None and role != user.role:
+            raise AuthenticationFailed(_("The user's role has been changed."), code="role_changed")
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """
+    JWTAuthentication for async views. Token checks and cache hits run in the event loop;
+    only a cache miss goes to a thread for the user lookup.
+    """
+    async def aauthenticate(self, request, raw_token=None):
+        if raw_token is None:
+            header = self.get_header(request)
+            if header is None:
+                return None
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user = user_cache.get(validated_token.get(api_settings.USER_ID_CLAIM))
+        if user is None:
+            return await sync_to_async(self.get_user)(validated_token)
+        self.check_user(user, validated_token)
+        self.check_role(user, validated_token)
+        return user
+
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """
+    Accept the METRICS_TOKEN bearer token of Prometheus scrapers; any other header is left to the next authenticator.
+    """
+    def authenticate(self, request):
+        token = settings.METRICS_TOKEN
+        if token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return AnonymousUser(), METRICS_AUTH
+        return None
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    """
+    Document CachedJWTAuthentication like the JWTAuthentication it extends.
+    """
+    target_class = 'fastfood_app.authentication.CachedJWTAuthentication'
+    match_subclasses = True
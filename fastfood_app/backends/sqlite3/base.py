@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend tuned for concurrent writers. New connections get SQLITE_PRAGMAS, and transactions
+    start with BEGIN IMMEDIATE: a deferred transaction that read first cannot take the write lock once
+    another writer committed, and fails with "database is locked" without waiting for busy_timeout.
+    On Django 5.1+ the transaction_mode option does the same.
+    """
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -1,39 +1,127 @@
-from math import sin, cos, radians, degrees, acos, ceil
-from .models import Order
+from math import sin, cos, radians, asin, sqrt, ceil, floor
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Food, Order, GEO_CELL_DEGREES
+from .scheduler import kitchen_scheduler
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.195
+MAX_GEO_CELLS = 400
+
+
+def _haversine(lat_a, long_a, lat_b, long_b):
+    lat_a, long_a, lat_b, long_b = radians(lat_a), radians(long_a), radians(lat_b), radians(long_b)
+    h = sin((lat_b - lat_a) / 2) ** 2 + cos(lat_a) * cos(lat_b) * sin((long_b - long_a) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(sqrt(min(1.0, h)))
+
+
+def get_distances(origins, destinations):
+    """
+    Calculate haversine distances in km between pairs of (lat, long) points.
+
+    A single origin or destination is paired with every point on the other side.
+    """
+    if np is not None:
+        origins = np.radians(np.asarray(origins, dtype=float).reshape(-1, 2))
+        destinations = np.radians(np.asarray(destinations, dtype=float).reshape(-1, 2))
+        lat_a, long_a = origins[:, 0], origins[:, 1]
+        lat_b, long_b = destinations[:, 0], destinations[:, 1]
+        h = np.sin((lat_b - lat_a) / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin((long_b - long_a) / 2) ** 2
+        return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))).tolist()
+
+    origins, destinations = list(origins), list(destinations)
+    if len(origins) == 1:
+        origins = origins * len(destinations)
+    elif len(destinations) == 1:
+        destinations = destinations * len(origins)
+    if len(origins) != len(destinations):
+        raise ValueError('origins and destinations must have the same length')
+    return [_haversine(lat_a, long_a, lat_b, long_b) for (lat_a, long_a), (lat_b, long_b) in zip(origins, destinations)]
 
 
 def get_distance(lat_a, long_a, lat_b, long_b):
     """
-    Calculate distance between two location.
+    Calculate distance between two location in km.
     """
-    lat_a, long_a, lat_b, long_b = radians(lat_a), radians(long_a), radians(lat_b), radians(long_b)
+    return _haversine(lat_a, long_a, lat_b, long_b)
+
+
+def get_geo_cells(lat, long, radius_km):
+    """
+    List grid cells covering a circle, or None when cell pruning does not pay off.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    long_delta = radius_km / (KM_PER_DEGREE * max(cos(radians(min(89.0, abs(lat) + lat_delta))), 0.01))
+    if long - long_delta < -180 or long + long_delta > 180:
+        return None
+    lat_cells = range(floor((lat - lat_delta) / GEO_CELL_DEGREES), floor((lat + lat_delta) / GEO_CELL_DEGREES) + 1)
+    long_cells = range(floor((long - long_delta) / GEO_CELL_DEGREES), floor((long + long_delta) / GEO_CELL_DEGREES) + 1)
+    if len(lat_cells) * len(long_cells) > MAX_GEO_CELLS:
+        return None
+    return [f"{lat_cell}:{long_cell}" for lat_cell in lat_cells for long_cell in long_cells]
 
-    long_diff = long_a - long_b
-    distance = (sin(lat_a) * sin(lat_b) +
-                cos(lat_a) * cos(lat_b) * cos(long_diff))
-    distance_in_km = abs(int(degrees(acos(distance)) * 111.133))
-    return distance_in_km
 
+def get_foods_near(lat, long, radius_km, queryset=None):
+    """
+    Return (food, distance) pairs within radius_km of a point, nearest first.
+    """
+    foods = Food.objects.all() if queryset is None else queryset
+    cells = get_geo_cells(lat, long, radius_km)
+    if cells is not None:
+        foods = foods.filter(geo_cell__in=cells)
+    foods = list(foods)
+    distances = get_distances([(lat, long)], [(food.address_lat_a, food.address_long_a) for food in foods])
+    nearby = [(food, distance) for food, distance in zip(foods, distances) if distance <= radius_km]
+    return sorted(nearby, key=lambda pair: pair[1])
 
-def estimate_time(distance, order_count):
+
+def estimate_time(distance, ready_at, now=None):
     """
-    Calculate estimate_date.
+    Calculate estimate_date from the time the kitchen has the order ready.
     """
-    total_count = order_count
-    for order in Order.objects.filter(delivered=False, food_on_the_way=False):
-        total_count += order.count
-    ready_time = ceil(total_count/4)*5
-    driver_time = distance*3
+    now = now or timezone.now()
+    ready_time = max(0, ceil((ready_at - now).total_seconds()/60))
+    driver_time = ceil(distance*3)
     return ready_time + driver_time
 
 
-def change_estimates(order):
+def recompute_estimates():
     """
-    Update newer estimate_date's after deleting Order item
+    Rebuild the kitchen timeline from the pending orders, in queue order, and refresh their estimate_date.
+
+    Dishes in slots that already started are cooked and keep their booking; an order whose food is ready is
+    left alone. The rest of every order is packed again from the current slot, so capacity freed by a
+    cancelled order goes to the orders behind it. Orders and slots are read once and written in bulk while
+    the timeline is locked, so a reservation made meanwhile waits for the new timeline.
     """
-    minutes = max(0, ceil(order.count/4)*5)
-    created_date = order.date
-    orders = Order.objects.filter(delivered=False, food_on_the_way=False, date__gte=created_date)
-    for order in orders:
-        order.estimate_date = max(1, order.estimate_date - minutes)
-        order.save()
+    now = timezone.now()
+    current = kitchen_scheduler.slot_of(now)
+    with transaction.atomic():
+        kitchen_scheduler.lock()
+        orders = list(Order.objects.filter(delivered=False, food_on_the_way=False)
+                      .filter(Q(ready_at__isnull=True) | Q(ready_at__gt=now))
+                      .select_for_update(of=('self',)).select_related('food')
+                      .only('id', 'count', 'address_lat_a', 'address_long_a', 'estimate_date', 'ready_at', 'kitchen_slots',
+                            'food__address_lat_a', 'food__address_long_a')
+                      .order_by(F('ready_at').asc(nulls_last=True), 'date', 'id'))
+        distances = get_distances([(order.address_lat_a, order.address_long_a) for order in orders],
+                                  [(order.food.address_lat_a, order.food.address_long_a) for order in orders])
+        timeline = {}
+        changed = []
+        for order, distance in zip(orders, distances):
+            cooked = [[slot, dishes] for slot, dishes in order.kitchen_slots if slot < current]
+            kitchen_slots = cooked + kitchen_scheduler.pack(timeline, order.count - sum(dishes for _, dishes in cooked), current)
+            ready_at = kitchen_scheduler.ready_time(kitchen_slots)
+            estimate_date = estimate_time(distance, ready_at, now)
+            if (kitchen_slots, ready_at, estimate_date) != (order.kitchen_slots, order.ready_at, order.estimate_date):
+                order.kitchen_slots, order.ready_at, order.estimate_date = kitchen_slots, ready_at, estimate_date
+                changed.append(order)
+        Order.objects.bulk_update(changed, ['kitchen_slots', 'ready_at', 'estimate_date'], batch_size=500)
+        kitchen_scheduler.rewrite(timeline)
+    return len(changed)
@@ -0,0 +1,64 @@
+import threading
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, BigIntegerField
+from django.db.models.functions import Cast, Floor
+from .models import ExchangeRate, ExchangeRateVersion, Food
+from .menu import bump_menu_version
+
+EXCHANGE_RATE_VERSION_ID = 1
+
+_lock = threading.Lock()
+_rates = None
+_version = None
+
+
+def get_exchange_rate_version():
+    version = ExchangeRateVersion.objects.filter(id=EXCHANGE_RATE_VERSION_ID).values_list('version', flat=True).first()
+    if version is None:
+        version = ExchangeRateVersion.objects.get_or_create(id=EXCHANGE_RATE_VERSION_ID)[0].version
+    return version
+
+
+def get_exchange_rates():
+    """
+    So'm value of one unit of every valyuta. Cached in the process and loaded again once the
+    ExchangeRateVersion row moved on, so every process prices with the rates stored last.
+    """
+    global _rates, _version
+    version = get_exchange_rate_version()
+    if _rates is None or _version != version:
+        with _lock:
+            rates = dict(settings.EXCHANGE_RATES)
+            rates.update(ExchangeRate.objects.values_list('valyuta', 'rate'))
+            _rates, _version = rates, version
+    return _rates
+
+
+def clear_exchange_rates():
+    global _rates
+    _rates = None
+
+
+def to_som(amount, valyuta, rates=None):
+    """
+    Convert an amount in valyuta to so'm; pass rates from get_exchange_rates when converting many amounts.
+    """
+    return int(amount * (rates or get_exchange_rates()).get(valyuta, 1))
+
+
+def set_exchange_rates(rates):
+    """
+    Store new rates and reprice every food in the changed valyutas with one UPDATE each; other processes see
+    the new rates through the version.
+    """
+    with transaction.atomic():
+        for valyuta, rate in rates.items():
+            ExchangeRate.objects.update_or_create(valyuta=valyuta, defaults={'rate': rate})
+            Food.objects.filter(valyuta=valyuta).update(
+                price_in_som=Cast(Floor(F('price') * rate), BigIntegerField()))
+        versions = ExchangeRateVersion.objects.filter(id=EXCHANGE_RATE_VERSION_ID)
+        if not versions.update(version=F('version') + 1):
+            ExchangeRateVersion.objects.get_or_create(id=EXCHANGE_RATE_VERSION_ID)
+            versions.update(version=F('version') + 1)
+        transaction.on_commit(bump_menu_version)
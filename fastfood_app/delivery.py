@@ -0,0 +1,26 @@
+from django.db import transaction
+from .models import Order, Delivered
+from .currency import get_exchange_rates, to_som
+from .jobs import enqueue
+
+
+def deliver_orders(user, ids):
+    """
+    Turn the user's assigned orders into Delivered rows and remove them in one transaction.
+    """
+    with transaction.atomic():
+        rates = get_exchange_rates()
+        orders = list(Order.objects.select_for_update(of=('self',)).select_related('food')
+                      .filter(id__in=ids, assigned_officiant=user, delivered=False))
+        delivered_rows = Delivered.objects.bulk_create([
+            Delivered(
+                responsible=user,
+                food=order.food,
+                sold_number=order.count,
+                total_income=to_som(order.food.price*order.count, order.food.valyuta, rates)
+            )
+            for order in orders
+        ])
+        enqueue('record_sales', {'ids': [delivered.id for delivered in delivered_rows]})
+        Order.objects.filter(id__in=[order.id for order in orders]).delete()
+    return orders, delivered_rows
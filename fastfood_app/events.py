@@ -0,0 +1,136 @@
+import asyncio
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+OFITSIANTS_CHANNEL = 'ofitsiants'
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """
+    Events of some channels, queued for one client on its event loop.
+
+    `lost` is set when the client fell behind and events were dropped.
+    """
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(SUBSCRIPTION_QUEUE_SIZE)
+        self.lost = False
+
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass # the client's loop is gone
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lost = True
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Pub/sub between request threads and event streams of one process.
+
+    Other backends need the same publish/subscribe/unsubscribe methods.
+    """
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self.lock:
+            for channel in channels:
+                self.subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscriptions = self.subscriptions.get(channel)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self.subscriptions[channel]
+
+    def publish(self, channel, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.EVENTS_BACKEND)()
+    return _broker
+
+
+def order_state(order):
+    if order.delivered:
+        return 'delivered'
+    if order.food_on_the_way:
+        return 'on_the_way'
+    if order.assigned_officiant_id:
+        return 'accepted'
+    return 'created'
+
+
+def order_event(order, state=None):
+    """
+    Small delta of an order, without the nested food.
+    """
+    return {
+        'id': order.id,
+        'state': state or order_state(order),
+        'food': order.food_id,
+        'count': order.count,
+        'estimate_date': order.estimate_date,
+        'ready_at': order.ready_at.isoformat() if order.ready_at else None,
+        'assigned_officiant': order.assigned_officiant_id,
+    }
+
+
+def publish_orders(orders, state):
+    """
+    Send order deltas to their users, and queue changes to officiants, once the transaction commits.
+    """
+    events = []
+    for order in orders:
+        event = order_event(order, state)
+        events.append((user_channel(order.user_id), event))
+        if state in ('created', 'accepted', 'cancelled'):
+            events.append((OFITSIANTS_CHANNEL, event))
+
+    def publish():
+        broker = get_broker()
+        for channel, event in events:
+            broker.publish(channel, event)
+
+    if events:
+        transaction.on_commit(publish)
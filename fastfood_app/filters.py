@@ -1,14 +1,85 @@
+from datetime import datetime
+import math
 import django_filters
+from django.utils import timezone
 from .models import Delivered
 
 
+def get_date_range(year, month=None):
+    """
+    Half-open [start, end) datetime range of a year or of one month in it.
+    """
+    if month is None:
+        start, end = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+    else:
+        start = datetime(year, month, 1)
+        end = datetime(year + month // 12, month % 12 + 1, 1)
+    return timezone.make_aware(start), timezone.make_aware(end)
+
+
+def parse_price(value):
+    price = float(value)
+    if not math.isfinite(price): # inf and nan parse as floats but fail in the query
+        raise ValueError(f'{value} is not a finite price')
+    return price
+
+
+def filter_foods_by_price(foods, params):
+    """
+    Apply ?min_price=, ?max_price= (in so'm) and ?ordering=price|-price; ValueError on bad numbers.
+    """
+    min_price = params.get('min_price')
+    max_price = params.get('max_price')
+    if min_price:
+        foods = foods.filter(price_in_som__gte=parse_price(min_price))
+    if max_price:
+        foods = foods.filter(price_in_som__lte=parse_price(max_price))
+    ordering = params.get('ordering')
+    if ordering == 'price':
+        foods = foods.order_by('price_in_som', 'id')
+    elif ordering == '-price':
+        foods = foods.order_by('-price_in_som', '-id')
+    return foods
+
+
+def parse_near(params):
+    """
+    Read ?near=lat,lng&radius_km= and return (lat, long, radius_km), or raise ValueError with a message.
+    """
+    try:
+        lat, long = (float(value) for value in params.get('near').split(','))
+        radius_km = float(params.get('radius_km', 5))
+    except ValueError:
+        raise ValueError("near must be 'lat,lng' and radius_km a number")
+    if not (-90 <= lat <= 90 and -180 <= long <= 180 and 0 < radius_km <= 1000):
+        raise ValueError("near or radius_km out of range")
+    return lat, long, radius_km
+
+
 class DeliveredFilter(django_filters.FilterSet):
     """
     Filters Delivered objects by year and month of their delivery date.
     """
-    year = django_filters.NumberFilter(field_name='date__year')
-    month = django_filters.NumberFilter(field_name='date__month')
+    year = django_filters.NumberFilter(method='filter_date')
+    month = django_filters.NumberFilter(method='filter_date')
 
     class Meta:
         model = Delivered
         fields = ['year', 'month']
+
+    def filter_date(self, queryset, name, value):
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        year = self.form.cleaned_data.get('year')
+        month = self.form.cleaned_data.get('month')
+        if year is not None:
+            try:
+                start, end = get_date_range(int(year), None if month is None else int(month))
+            except ValueError:
+                return queryset.none()
+            return queryset.filter(date__gte=start, date__lt=end)
+        if month is not None:
+            return queryset.filter(date__month=month)
+        return queryset
@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image as PILImage, ImageOps
+from .models import Image
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS, thread_name_prefix='images')
+    return _executor
+
+
+def hash_file(upload):
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def save_images(uploads):
+    """
+    Store uploads under content-hashed names and return their Image rows, reusing rows of identical files.
+    """
+    hashes = []
+    new_uploads = {}
+    for upload in uploads:
+        content_hash = hash_file(upload)
+        upload.name = content_hash + os.path.splitext(upload.name)[1].lower()
+        hashes.append(content_hash)
+        new_uploads.setdefault(content_hash, upload)
+    if not hashes:
+        return []
+
+    existing = set(Image.objects.filter(content_hash__in=new_uploads).values_list('content_hash', flat=True))
+    Image.objects.bulk_create([
+        Image(content_hash=content_hash) for content_hash in new_uploads if content_hash not in existing
+    ], ignore_conflicts=True)
+    images = {image.content_hash: image for image in Image.objects.filter(content_hash__in=new_uploads)}
+    # rows without a file are the ones inserted above; rows that lost the conflict keep the other upload's file
+    inserted = [image for image in images.values() if not image.image]
+    for image in inserted:
+        upload = new_uploads[image.content_hash]
+        image.image.save(upload.name, upload, save=False)
+    Image.objects.bulk_update(inserted, ['image'])
+    schedule_image_processing([image.id for image in images.values() if not image.variants])
+    return [images[content_hash] for content_hash in dict.fromkeys(hashes)]
+
+
+def schedule_image_processing(image_ids):
+    """
+    Build variants of images in the worker pool once the current transaction commits.
+    """
+    def submit():
+        executor = get_executor()
+        for image_id in image_ids:
+            executor.submit(run_image_job, image_id)
+
+    if image_ids:
+        transaction.on_commit(submit)
+
+
+def run_image_job(image_id):
+    try:
+        process_image(image_id)
+    except Exception:
+        logger.exception('Could not process image %s', image_id)
+    finally:
+        connections.close_all()
+
+
+def variant_widths(width):
+    """
+    Configured widths narrower than the original, plus the original itself when it is not too wide.
+    """
+    widths = [size for size in settings.IMAGE_WIDTHS if size < width]
+    if width <= max(settings.IMAGE_WIDTHS):
+        widths.append(width)
+    return widths
+
+
+def to_rgb(picture):
+    if picture.mode in ('RGBA', 'LA', 'P'):
+        picture = picture.convert('RGBA')
+        background = PILImage.new('RGB', picture.size, (255, 255, 255))
+        background.paste(picture, mask=picture.getchannel('A'))
+        return background
+    return picture.convert('RGB')
+
+
+def variant_directory(content_hash):
+    """
+    Storage directory of the variants of an image; it depends only on the content hash.
+    """
+    return f"food_images/{content_hash[:2]}/{content_hash}"
+
+
+def save_variant(picture, name, format):
+    """
+    Encode a variant unless a file with its content-hashed name already exists.
+    """
+    if not default_storage.exists(name):
+        pil_format, options = VARIANT_FORMATS[format]
+        buffer = BytesIO()
+        picture.save(buffer, pil_format, **options)
+        saved = default_storage.save(name, ContentFile(buffer.getvalue()))
+        if saved != name:
+            default_storage.delete(saved) # another worker wrote the same variant first
+    return name
+
+
+def process_image(image_id):
+    """
+    Write the thumbnail and width variants of an image in every format and record them on the row.
+    """
+    image = Image.objects.filter(id=image_id).first()
+    if image is None or not image.image:
+        return None
+    with image.image.open('rb') as file:
+        data = file.read()
+    content_hash = image.content_hash or hashlib.sha256(data).hexdigest()
+    with PILImage.open(BytesIO(data)) as original:
+        picture = to_rgb(ImageOps.exif_transpose(original))
+
+    base = variant_directory(content_hash)
+    size = settings.IMAGE_THUMBNAIL_SIZE
+    thumbnail = ImageOps.fit(picture, (size, size), PILImage.LANCZOS)
+    variants = {'thumbnail': save_variant(thumbnail, f"{base}/thumb.webp", 'webp')}
+    for format in VARIANT_FORMATS:
+        variants[format] = {}
+    for width in variant_widths(picture.width):
+        height = max(1, round(picture.height * width / picture.width))
+        resized = picture if width == picture.width else picture.resize((width, height), PILImage.LANCZOS)
+        for format in VARIANT_FORMATS:
+            variants[format][str(width)] = save_variant(resized, f"{base}/{width}.{format}", format)
+
+    image.variants = variants
+    update_fields = ['variants']
+    if image.content_hash is None and not Image.objects.filter(content_hash=content_hash).exists():
+        image.content_hash = content_hash
+        update_fields.append('content_hash')
+    image.save(update_fields=update_fields)
+    return variants
+
+
+def image_file_names(image):
+    """
+    Storage names of the original and every variant of an image.
+    """
+    names = [image.image.name] if image.image else []
+    variants = image.variants or {}
+    if variants.get('thumbnail'):
+        names.append(variants['thumbnail'])
+    for format in VARIANT_FORMATS:
+        names.extend(variants.get(format, {}).values())
+    return names
+
+
+def files_in_use(names, content_hashes):
+    """
+    Those of names still used by an Image with one of content_hashes, such as a re-upload of a deleted image
+    whose variants share its paths.
+    """
+    used = set()
+    for image in Image.objects.filter(content_hash__in=content_hashes):
+        directory = variant_directory(image.content_hash) + '/'
+        used.update(name for name in names if name.startswith(directory))
+        used.update(image_file_names(image))
+    return used.intersection(names)
@@ -0,0 +1,195 @@
+import codecs
+import csv
+import json
+from itertools import islice
+from django.db import DatabaseError, transaction
+from .models import Food, Image, geo_cell
+from .currency import get_exchange_rates, to_som
+from .menu import bump_menu_version
+from .serializers import FoodImportSerializer
+
+IMPORT_BATCH_SIZE = 500
+JSON_CHUNK_SIZE = 64 * 1024
+JSON_ITEM_LIMIT = 1024 * 1024 # longest item of a JSON array upload, in characters
+MAX_REPORTED_ERRORS = 1000
+UPDATE_FIELDS = ['name', 'price', 'valyuta', 'price_in_som', 'address_lat_a', 'address_long_a', 'geo_cell', 'description']
+
+
+class RowError:
+    """
+    Stands in for a line of an upload that could not be parsed, so the import reports it and goes on.
+    """
+    def __init__(self, message):
+        self.message = message
+
+
+def decode_lines(upload):
+    for number, line in enumerate(upload):
+        yield line.decode('utf-8-sig' if number == 0 else 'utf-8', 'replace')
+
+
+def iter_json_array(stream):
+    """
+    Parse the items of a JSON array one at a time, reading the stream JSON_CHUNK_SIZE characters at a time.
+    A malformed item becomes a RowError and ends the file, as nothing after it can be trusted.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, done = '', 0, False
+
+    def fill():
+        nonlocal buffer, position, done
+        chunk = stream.read(JSON_CHUNK_SIZE)
+        done = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+    def skip_space():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if done:
+                return ''
+            fill()
+
+    if skip_space() != '[':
+        raise ValueError('Expected a JSON array')
+    position += 1
+    if skip_space() == ']':
+        return
+    while True:
+        skip_space()
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except ValueError as e:
+            if done or len(buffer) - position > JSON_ITEM_LIMIT:
+                yield RowError(f'Cannot parse item: {e}')
+                return
+            fill()
+            continue
+        if end == len(buffer) and not done:
+            fill() # a number cut by the chunk edge may go on
+            continue
+        position = end
+        yield item
+        separator = skip_space()
+        if separator == ']':
+            return
+        if separator != ',':
+            yield RowError(f'Expected "," or "]" after an item, got {separator!r}')
+            return
+        position += 1
+
+
+def iter_upload_rows(upload):
+    """
+    Read rows of an uploaded CSV, NDJSON or JSON array file one at a time.
+    A bad CSV or NDJSON line becomes a RowError instead of ending the file.
+    """
+    name = (upload.name or '').lower()
+    if name.endswith('.json'):
+        yield from iter_json_array(codecs.getreader('utf-8-sig')(upload))
+        return
+    if name.endswith('.csv'):
+        reader = csv.DictReader(decode_lines(upload))
+        while True:
+            try:
+                yield next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                yield RowError(f'Cannot parse line: {e}')
+    for number, line in enumerate(upload):
+        try:
+            line = line.decode('utf-8-sig' if number == 0 else 'utf-8')
+            if line.strip():
+                yield json.loads(line)
+        except ValueError as e:
+            yield RowError(f'Cannot parse line: {e}')
+
+
+def import_foods(rows):
+    """
+    Upsert foods by code in batches and return a report with per-row errors.
+    """
+    report = {'imported': 0, 'failed': 0, 'errors': []}
+
+    def add_error(row_number, errors):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': row_number, 'errors': errors})
+
+    rows = enumerate(rows, start=1)
+    try:
+        import_batches(rows, report, add_error)
+    finally:
+        if report['imported']:
+            transaction.on_commit(bump_menu_version)
+    return report
+
+
+def import_batches(rows, report, add_error):
+    while True:
+        batch = {}
+        for row_number, row in islice(rows, IMPORT_BATCH_SIZE):
+            if isinstance(row, RowError):
+                add_error(row_number, row.message)
+                continue
+            serializer = FoodImportSerializer(data=row) if isinstance(row, dict) else None
+            if serializer is None or not serializer.is_valid():
+                add_error(row_number, serializer.errors if serializer else 'Row must be an object')
+                continue
+            code = serializer.validated_data['code']
+            if code in batch:
+                add_error(row_number, {'code': [f'Duplicate of row {batch[code][0]}']})
+                continue
+            batch[code] = (row_number, serializer.validated_data)
+        if not batch:
+            break
+        rows_to_save = check_images(batch.values(), add_error)
+        try:
+            with transaction.atomic():
+                save_batch(rows_to_save)
+        except DatabaseError as e:
+            for row_number, _ in rows_to_save:
+                add_error(row_number, str(e))
+            continue
+        report['imported'] += len(rows_to_save)
+
+
+def check_images(batch, add_error):
+    """
+    Drop rows pointing at images that do not exist.
+    """
+    image_ids = {image for _, data in batch for image in data['images']}
+    images = set(Image.objects.filter(id__in=image_ids).values_list('id', flat=True))
+    rows = []
+    for row_number, data in batch:
+        missing = [image for image in data['images'] if image not in images]
+        if missing:
+            add_error(row_number, {'images': [f"Image not found: {', '.join(map(str, missing))}"]})
+        else:
+            rows.append((row_number, data))
+    return rows
+
+
+def save_batch(rows):
+    rates = get_exchange_rates()
+    foods = []
+    for _, data in rows:
+        food = Food(**{key: value for key, value in data.items() if key != 'images'})
+        food.geo_cell = geo_cell(food.address_lat_a, food.address_long_a)
+        food.price_in_som = to_som(food.price, food.valyuta, rates)
+        foods.append(food)
+    if not foods:
+        return
+
+    Food.objects.bulk_create(foods, update_conflicts=True, unique_fields=['code'], update_fields=UPDATE_FIELDS)
+    food_ids = dict(Food.objects.filter(code__in=[food.code for food in foods]).values_list('code', 'id'))
+    through = Food.image.through
+    through.objects.bulk_create([
+        through(food_id=food_ids[data['code']], image_id=image)
+        for _, data in rows
+        for image in data['images']
+    ], ignore_conflicts=True)
@@ -0,0 +1,138 @@
+import logging
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+import django
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+class ClaimLost(Exception):
+    """
+    The job was requeued while it ran, so another run owns it now.
+    """
+
+
+def task(name):
+    """
+    Register a function as the task run by jobs called name.
+    """
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, key=None, delay=0):
+    """
+    Queue a task inside the current transaction, so it only runs if the transaction commits.
+
+    While a job with the same key is still pending, queueing it again does nothing.
+    """
+    if name not in TASKS:
+        raise ValueError(f'Unknown task: {name}')
+    job = Job(name=name, payload=payload or {}, key=key, run_at=timezone.now() + timedelta(seconds=delay))
+    Job.objects.bulk_create([job], ignore_conflicts=True)
+
+
+def claim_jobs(limit):
+    """
+    Mark up to limit due jobs as running and return their ids.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = Job.objects.filter(status='pending', run_at__lte=now).order_by('run_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('id', flat=True)[:limit])
+        Job.objects.filter(id__in=ids, status='pending').update(status='running', locked_at=now, attempts=F('attempts') + 1)
+    return list(Job.objects.filter(id__in=ids, status='running', locked_at=now).values_list('id', flat=True))
+
+
+def requeue_stale_jobs():
+    """
+    Put back jobs left running by a worker that died.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT)
+    for job in Job.objects.filter(status='running', locked_at__lt=cutoff):
+        retry_or_fail(job, 'Worker timed out')
+
+
+def retry_or_fail(job, error):
+    if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+        changes = {'status': 'failed'}
+    else:
+        delay = settings.JOB_RETRY_DELAY * 2 ** max(job.attempts - 1, 0)
+        changes = {'status': 'pending', 'run_at': timezone.now() + timedelta(seconds=delay)}
+    claimed = Job.objects.filter(id=job.id, status='running', locked_at=job.locked_at)
+    try:
+        with transaction.atomic():
+            claimed.update(locked_at=None, last_error=error, **changes)
+    except IntegrityError:
+        # a newer job with the same key is already pending and will do the work
+        claimed.delete()
+
+
+def run_job(job_id):
+    """
+    Run one claimed job. Its work and its removal from the queue commit together, and both roll back
+    when the claim was lost to requeue_stale_jobs meanwhile.
+    """
+    close_old_connections()
+    try:
+        job = Job.objects.filter(id=job_id, status='running').first()
+        if job is None:
+            return False
+        try:
+            func = TASKS.get(job.name)
+            if func is None:
+                raise LookupError(f'Unknown task: {job.name}')
+            with transaction.atomic():
+                func(**job.payload)
+                deleted, _ = Job.objects.filter(id=job.id, status='running', locked_at=job.locked_at).delete()
+                if not deleted:
+                    raise ClaimLost
+        except ClaimLost:
+            logger.warning('Job %s (%s) was requeued while running, its work was rolled back', job.id, job.name)
+            return False
+        except Exception:
+            logger.exception('Job %s (%s) failed', job.id, job.name)
+            retry_or_fail(job, traceback.format_exc())
+            return False
+        return True
+    finally:
+        close_old_connections()
+
+
+def work(workers=4, processes=False, once=False, idle_sleep=1.0):
+    """
+    Run queued jobs in a thread or process pool until interrupted, or until the queue is empty when once is set.
+
+    Return the number of jobs that succeeded.
+    """
+    if processes:
+        # spawned children open their own connections instead of sharing the parent's
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=django.setup)
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jobs')
+    succeeded = 0
+    with executor:
+        while True:
+            requeue_stale_jobs()
+            ids = claim_jobs(workers)
+            if ids:
+                succeeded += sum(executor.map(run_job, ids))
+                continue
+            if once:
+                return succeeded
+            time.sleep(idle_sleep)
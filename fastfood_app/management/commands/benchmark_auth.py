@@ -0,0 +1,84 @@
+import importlib.util
+import time
+from statistics import quantiles
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.test import APIClient
+from fastfood_app.models import User
+
+HASHERS = {
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD = 'Bench-pass-2024!'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Measure registration and login throughput with each password hasher, '
+            'including the first login of a PBKDF2 account that gets rehashed. Nothing is kept in the database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Requests per endpoint and hasher.')
+        parser.add_argument('--hashers', default=','.join(HASHERS), help='Comma separated: ' + ', '.join(HASHERS))
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['hashers'].split(',') if name.strip()]
+        unknown = set(names) - set(HASHERS)
+        if unknown:
+            raise CommandError(f"Unknown hashers: {', '.join(sorted(unknown))}")
+
+        self.stdout.write(f"{'hasher':<8} {'endpoint':<16} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for name in names:
+            if name == 'argon2' and importlib.util.find_spec('argon2') is None:
+                self.stderr.write('argon2-cffi is not installed, skipping argon2')
+                continue
+            hashers = [HASHERS[name]] + [path for path in HASHERS.values() if path != HASHERS[name]
+                                         and (path != HASHERS['argon2'] or importlib.util.find_spec('argon2'))]
+            with override_settings(PASSWORD_HASHERS=hashers, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                try:
+                    with transaction.atomic():
+                        self.bench(name, options['requests'])
+                        raise Rollback
+                except Rollback:
+                    pass
+
+    def bench(self, name, requests):
+        client = APIClient()
+        usernames = [f'bench-{name}-{i}' for i in range(requests)]
+        self.report(name, 'register', [
+            self.timed(client.post, '/account/register/', {'username': username, 'password': PASSWORD}, 201)
+            for username in usernames
+        ])
+        self.report(name, 'login', [
+            self.timed(client.post, '/account/login/', {'username': username, 'password': PASSWORD}, 200)
+            for username in usernames
+        ])
+        if name != 'pbkdf2':
+            encoded = make_password(PASSWORD, hasher='pbkdf2_sha256')
+            for username in usernames:
+                User.objects.filter(username=username).update(password=encoded)
+            self.report(name, 'login (rehash)', [
+                self.timed(client.post, '/account/login/', {'username': username, 'password': PASSWORD}, 200)
+                for username in usernames
+            ])
+
+    def timed(self, method, url, data, expected_status):
+        started = time.perf_counter()
+        response = method(url, data, format='json')
+        elapsed = time.perf_counter() - started
+        if response.status_code != expected_status:
+            raise CommandError(f'{url} answered {response.status_code}: {response.content[:200]!r}')
+        return elapsed
+
+    def report(self, name, endpoint, timings):
+        milliseconds = [timing * 1000 for timing in timings]
+        cuts = quantiles(milliseconds, n=100) if len(milliseconds) > 1 else milliseconds * 99
+        self.stdout.write(f'{name:<8} {endpoint:<16} {len(timings) / sum(timings):>8.1f} {cuts[49]:>8.1f} {cuts[94]:>8.1f}')
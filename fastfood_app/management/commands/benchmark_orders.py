@@ -0,0 +1,217 @@
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from statistics import quantiles
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from fastfood_app.authentication import RoleRefreshToken
+from fastfood_app.filters import get_date_range
+from fastfood_app.jobs import work
+from fastfood_app.models import User, Food, Delivered, Job
+from fastfood_app.seed import SEED_PREFIX, near
+
+STEPS = ['create', 'accept', 'on_the_way', 'deliver', 'report']
+METRICS = {'p50': 49, 'p95': 94, 'p99': 98}
+
+
+class ClientTransport:
+    """
+    Call the views in process through the Django test client, on the database of the settings.
+    """
+    def request(self, method, path, token, data=None):
+        client = APIClient(raise_request_exception=False)
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = getattr(client, method)(path, data, format='json')
+        return response.status_code, response.content
+
+
+class ServerTransport:
+    """
+    Call a running server over HTTP.
+    """
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.host = next((host for host in settings.ALLOWED_HOSTS if '://' not in host and host != '*'), None)
+
+    def request(self, method, path, token, data=None):
+        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+        if self.host:
+            headers['Host'] = self.host
+        body = json.dumps(data).encode() if data is not None else None
+        request = urllib.request.Request(self.url + path, data=body, headers=headers, method=method.upper())
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+        except (urllib.error.URLError, OSError):
+            return 0, b''
+
+
+def parse_budget(value):
+    try:
+        target, limit = value.split('=')
+        step, metric = target.split('.')
+        limit = float(limit)
+    except ValueError:
+        raise CommandError(f'Budget {value!r} is not STEP.METRIC=VALUE, like create.p95=150')
+    if step not in STEPS or metric not in [*METRICS, 'rps']:
+        raise CommandError(f"Budget {value!r}: steps are {', '.join(STEPS)}; metrics are {', '.join(METRICS)} and rps")
+    return step, metric, limit
+
+
+class Command(BaseCommand):
+    help = ('Run the order lifecycle (create, accept, on the way, deliver, report) concurrently against seeded data '
+            'and fail when a step misses its latency or throughput budget. Run seed_data first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cycles', type=int, default=200, help='Orders taken through the whole lifecycle.')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Lifecycles in flight at once; above 1 SQLite latencies mostly measure lock waits.')
+        parser.add_argument('--url', help='Base URL of a running server; without it the views run in process.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed picking users, foods and addresses.')
+        parser.add_argument('--budget', action='append', default=[], type=parse_budget,
+                            help='STEP.METRIC=VALUE, e.g. deliver.p95=200 (ms) or create.rps=50; '
+                                 'overrides BENCHMARK_BUDGETS.')
+
+    def handle(self, *args, **options):
+        customers = list(User.objects.filter(username__startswith=f'{SEED_PREFIX}user-').order_by('id'))
+        staff = list(User.objects.filter(username__startswith=f'{SEED_PREFIX}ofitsiant-').order_by('id'))
+        self.food_ids = list(Food.objects.filter(code__startswith=SEED_PREFIX).order_by('id').values_list('id', flat=True))
+        if not (customers and staff and self.food_ids):
+            raise CommandError('No seed users, ofitsiants or foods; run seed_data first')
+        self.customers = [str(RoleRefreshToken.for_user(user).access_token) for user in customers]
+        self.staff = [(user.id, str(RoleRefreshToken.for_user(user).access_token)) for user in staff]
+        self.seed = options['seed']
+        self.threaded = options['concurrency'] > 1
+        today = timezone.localdate()
+        self.report_path = f'/ofitsiant/delivereds/{today.month}/{today.year}/summary/'
+        self.month = get_date_range(today.year, today.month)
+
+        budgets = {step: dict(limits) for step, limits in settings.BENCHMARK_BUDGETS.items()}
+        for step, metric, limit in options['budget']:
+            budgets.setdefault(step, {})[metric] = limit
+
+        if options['url']:
+            self.transport = ServerTransport(options['url'])
+            results, elapsed = self.run(options['cycles'], options['concurrency'])
+        else:
+            self.transport = ClientTransport()
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                results, elapsed = self.run(options['cycles'], options['concurrency'])
+
+        failures = self.report(results, elapsed, budgets)
+        if failures:
+            raise CommandError('Budgets missed: ' + '; '.join(failures))
+        self.stdout.write(self.style.SUCCESS(f"{options['cycles']} lifecycles within budget"))
+
+    def run(self, cycles, concurrency):
+        started = time.perf_counter()
+        if self.threaded:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(self.cycle, range(cycles)))
+        else:
+            results = [self.cycle(number) for number in range(cycles)]
+        return results, time.perf_counter() - started
+
+    def cycle(self, number):
+        """
+        Take one new order through every step, stopping at the first step that fails.
+        """
+        rng = random.Random(self.seed * 1_000_003 + number)
+        customer, (ofitsiant_id, ofitsiant) = rng.choice(self.customers), rng.choice(self.staff)
+        lat, long = near(rng)
+        order = {'food': rng.choice(self.food_ids), 'count': rng.randint(1, 4), 'address_lat_a': lat, 'address_long_a': long}
+        timings = []
+        try:
+            ok, body = self.step(timings, 'create', 'post', '/user/orders/post/', customer, order, 201)
+            if not ok:
+                return timings
+            order_id = json.loads(body)['order']['id']
+            for step, method, path in [
+                ('accept', 'put', f'/ofitsiant/order/accept/put/{order_id}/'),
+                ('on_the_way', 'put', f'/ofitsiant/order/on-way/put/{order_id}/'),
+                ('deliver', 'put', f'/ofitsiant/order/delivered/put/{order_id}/'),
+            ]:
+                ok, _ = self.step(timings, step, method, path, ofitsiant, None, 200)
+                if not ok:
+                    return timings
+            sold = self.record_sales(ofitsiant_id, order['food'])
+            ok, body = self.step(timings, 'report', 'get', self.report_path, ofitsiant, None, 200)
+            if ok and not self.report_counts(body, order['food'], sold):
+                name, seconds, _ = timings[-1]
+                timings[-1] = (name, seconds, False)
+            return timings
+        finally:
+            if self.threaded and not isinstance(self.transport, ServerTransport):
+                connection.close()
+
+    def record_sales(self, ofitsiant_id, food_id):
+        """
+        Return how many dishes of a food the ofitsiant delivered this month, then run the queued jobs
+        adding those deliveries to the sales rollups, outside the timings. Jobs another lifecycle is
+        running are waited for.
+        """
+        start, end = self.month
+        sold = (Delivered.objects.filter(responsible_id=ofitsiant_id, food_id=food_id, date__gte=start, date__lt=end)
+                .aggregate(total=Coalesce(Sum('sold_number'), 0))['total'])
+        queued = Job.objects.filter(id__lte=Job.objects.order_by('-id').values_list('id', flat=True).first() or 0,
+                                    status__in=['pending', 'running'])
+        work(workers=1, once=True)
+        while queued.exists():
+            time.sleep(0.01)
+        return sold
+
+    def report_counts(self, body, food_id, sold):
+        """
+        Check that the report counts every dish of the food delivered before it was asked for.
+        """
+        foods = {food['food']: food['sold_number'] for food in json.loads(body)['foods']}
+        return foods.get(food_id, 0) >= sold
+
+    def step(self, timings, name, method, path, token, data, expected_status):
+        started = time.perf_counter()
+        status_code, body = self.transport.request(method, path, token, data)
+        ok = status_code == expected_status
+        timings.append((name, time.perf_counter() - started, ok))
+        return ok, body
+
+    def report(self, results, elapsed, budgets):
+        by_step = {step: [] for step in STEPS}
+        errors = dict.fromkeys(STEPS, 0)
+        for timings in results:
+            for step, seconds, ok in timings:
+                by_step[step].append(seconds * 1000)
+                errors[step] += not ok
+
+        failures = []
+        self.stdout.write(f"{'step':<12} {'count':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+        for step in STEPS:
+            latencies = by_step[step]
+            if not latencies:
+                self.stdout.write(f'{step:<12} {0:>6}')
+                failures.append(f'{step} never ran')
+                continue
+            cuts = quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            measured = {metric: cuts[index] for metric, index in METRICS.items()}
+            measured['rps'] = len(latencies) / elapsed
+            self.stdout.write(f"{step:<12} {len(latencies):>6} {measured['rps']:>8.1f} {measured['p50']:>8.1f} "
+                              f"{measured['p95']:>8.1f} {measured['p99']:>8.1f} {errors[step]:>6}")
+            if errors[step]:
+                failures.append(f'{step} failed {errors[step]} times')
+            for metric, limit in budgets.get(step, {}).items():
+                if metric == 'rps' and measured[metric] < limit:
+                    failures.append(f'{step} {measured[metric]:.1f} req/s < {limit:g}')
+                elif metric != 'rps' and measured[metric] > limit:
+                    failures.append(f'{step} {metric} {measured[metric]:.1f} ms > {limit:g} ms')
+        self.stdout.write(f'{len(results) / elapsed:.1f} lifecycles/s over {elapsed:.2f} s')
+        return failures
@@ -0,0 +1,104 @@
+import importlib.util
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from statistics import quantiles
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+from fastfood_app.models import User
+
+ENDPOINTS = ['user/foods/get/', 'user/orders/get/', 'ofitsiant/orders/get/', 'ofitsiant/orders-assigned/get/']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+class Command(BaseCommand):
+    help = ('Compare throughput of the hot read endpoints under the WSGI server, '
+            'and of their sync and async views under uvicorn.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='Admin or ofitsiant to authenticate as (default: the first one).')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=20, help='Requests in flight at once.')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(role__in=['admin', 'ofitsiant']).order_by('id')
+        if options['username']:
+            users = users.filter(username=options['username'])
+        user = users.first()
+        if user is None:
+            raise CommandError('An admin or ofitsiant user is needed to call every endpoint')
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        host = next((host for host in settings.ALLOWED_HOSTS if '://' not in host and host != '*'), None)
+        if host:
+            self.headers['Host'] = host
+
+        concurrency = options['concurrency']
+        runs = [('wsgi', self.wsgi_command(concurrency), '')]
+        if importlib.util.find_spec('uvicorn') is None:
+            self.stderr.write('uvicorn is not installed, skipping the ASGI runs (pip install uvicorn)')
+        else:
+            asgi = [sys.executable, '-m', 'uvicorn', 'conf.asgi:application', '--log-level', 'warning', '--port', '{port}']
+            runs += [('asgi', asgi, ''), ('asgi', asgi, 'async/')]
+
+        self.stdout.write(f"{'server':<6} {'endpoint':<38} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>6}")
+        for server, command, prefix in runs:
+            port = free_port()
+            process = subprocess.Popen([arg.format(port=port) for arg in command], cwd=settings.BASE_DIR,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                if not wait_for_port(port):
+                    raise CommandError(f'{server} server did not start')
+                for endpoint in ENDPOINTS:
+                    url = f'http://127.0.0.1:{port}/{prefix}{endpoint}'
+                    self.run(server, prefix + endpoint, url, options['requests'], concurrency)
+            finally:
+                process.terminate()
+                process.wait()
+
+    def wsgi_command(self, concurrency):
+        if importlib.util.find_spec('gunicorn') is not None:
+            return [sys.executable, '-m', 'gunicorn', 'conf.wsgi:application', '--workers', '1',
+                    '--threads', str(concurrency), '--bind', '127.0.0.1:{port}']
+        return [sys.executable, 'manage.py', 'runserver', '--noreload', '--skip-checks', '127.0.0.1:{port}']
+
+    def fetch(self, url):
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers=self.headers), timeout=30) as response:
+                response.read()
+                ok = response.status == 200
+        except (urllib.error.URLError, OSError):
+            ok = False
+        return time.perf_counter() - started, ok
+
+    def run(self, server, endpoint, url, requests, concurrency):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(self.fetch, [url] * concurrency)) # warm up
+            started = time.perf_counter()
+            results = list(executor.map(self.fetch, [url] * requests))
+            elapsed = time.perf_counter() - started
+        latencies = [latency * 1000 for latency, _ in results]
+        cuts = quantiles(latencies, n=100)
+        errors = sum(not ok for _, ok in results)
+        self.stdout.write(f'{server:<6} {endpoint:<38} {requests / elapsed:>8.1f} {cuts[49]:>8.1f} {cuts[94]:>8.1f} {errors:>6}')
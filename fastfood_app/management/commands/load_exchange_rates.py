@@ -0,0 +1,35 @@
+import csv
+import json
+from django.core.management.base import BaseCommand, CommandError
+from fastfood_app.currency import set_exchange_rates
+from fastfood_app.models import get_valyutas
+
+
+class Command(BaseCommand):
+    help = "Load so'm exchange rates from a JSON object or a 'valyuta,rate' CSV file and reprice foods."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON like {"usd": 12600} or CSV rows like usd,12600')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            with open(path, newline='') as file:
+                if path.endswith('.json'):
+                    rows = json.load(file).items()
+                else:
+                    rows = [row for row in csv.reader(file) if row and not row[0].startswith('#')]
+                rates = {valyuta.strip().lower(): float(rate) for valyuta, rate in rows}
+        except (OSError, ValueError, AttributeError) as e:
+            raise CommandError(f'Cannot read rates from {path}: {e}')
+
+        unknown = set(rates) - set(get_valyutas())
+        if unknown:
+            raise CommandError(f"Unknown valyuta: {', '.join(sorted(unknown))}")
+        if any(rate <= 0 for rate in rates.values()):
+            raise CommandError('Rates must be positive')
+
+        set_exchange_rates(rates)
+        for valyuta, rate in sorted(rates.items()):
+            self.stdout.write(f'{valyuta}: {rate}')
+        self.stdout.write(self.style.SUCCESS(f'Loaded {len(rates)} exchange rates'))
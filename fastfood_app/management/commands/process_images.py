@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from fastfood_app.images import process_image
+from fastfood_app.models import Image
+
+
+class Command(BaseCommand):
+    help = 'Build thumbnails and width variants of images that do not have them yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild variants of every image.')
+
+    def handle(self, *args, **options):
+        images = Image.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            images = images.filter(variants={})
+        processed = 0
+        for image_id in images.values_list('id', flat=True).iterator():
+            try:
+                process_image(image_id)
+                processed += 1
+            except Exception as e:
+                self.stderr.write(f'Image {image_id}: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} images'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from fastfood_app.reports import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily and monthly sales rollups from delivered orders.'
+
+    def handle(self, *args, **options):
+        created = rebuild_sales_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Created {created} sales rollups'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from fastfood_app.calculations import recompute_estimates
+
+
+class Command(BaseCommand):
+    help = 'Rebuild estimate_date of all pending orders from the kitchen queue.'
+
+    def handle(self, *args, **options):
+        changed = recompute_estimates()
+        self.stdout.write(self.style.SUCCESS(f'Updated estimates of {changed} orders'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from fastfood_app.ratings import recompute_ratings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild rating sums, counts and averages of all foods from their rates.'
+
+    def handle(self, *args, **options):
+        updated = recompute_ratings()
+        self.stdout.write(self.style.SUCCESS(f'Recomputed ratings of {updated} foods'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from fastfood_app.jobs import work
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs in a thread or process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of jobs run at the same time.')
+        parser.add_argument('--processes', action='store_true', help='Use a process pool instead of threads.')
+        parser.add_argument('--once', action='store_true', help='Exit when no job is due instead of waiting for more.')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait between polls of an empty queue.')
+
+    def handle(self, *args, **options):
+        try:
+            succeeded = work(options['workers'], options['processes'], options['once'], options['sleep'])
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f'Ran {succeeded} jobs'))
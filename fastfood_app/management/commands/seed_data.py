@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from fastfood_app.seed import SEED_PASSWORD, clear_seed_data, seed_data
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a reproducible set of users, ofitsiants, foods, images and open orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--ofitsiants', type=int, default=20)
+        parser.add_argument('--foods', type=int, default=100)
+        parser.add_argument('--images', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--clear', action='store_true', help='Only delete earlier seed data.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            clear_seed_data()
+            self.stdout.write(self.style.SUCCESS('Seed data deleted'))
+            return
+        counts = seed_data(options['users'], options['ofitsiants'], options['foods'], options['images'],
+                           options['orders'], options['seed'])
+        summary = ', '.join(f'{count} {name}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Seeded {summary}; password {SEED_PASSWORD}'))
@@ -0,0 +1,64 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import F
+from rest_framework.renderers import JSONRenderer
+from .models import Food, MenuVersion
+from .serializers import FoodListSerializer
+
+MENU_VERSION_ID = 1
+MENU_TIMEOUT = 60 * 60
+
+
+def get_menu_version():
+    """
+    Return current menu version. It lives in a MenuVersion row, so every process sees a bump at once;
+    cached menus are keyed by version and never served after it moved on.
+    """
+    version = MenuVersion.objects.filter(id=MENU_VERSION_ID).values_list('version', flat=True).first()
+    if version is None:
+        version = MenuVersion.objects.get_or_create(id=MENU_VERSION_ID)[0].version
+    return version
+
+
+def bump_menu_version():
+    """
+    Invalidate cached menus after foods, images or ratings change.
+    """
+    versions = MenuVersion.objects.filter(id=MENU_VERSION_ID)
+    if not versions.update(version=F('version') + 1):
+        MenuVersion.objects.get_or_create(id=MENU_VERSION_ID)
+        versions.update(version=F('version') + 1)
+
+
+def get_menu_etag(version):
+    return f'"menu-{version}"'
+
+
+def get_menu_bytes(version):
+    """
+    Return the serialized menu of a version, building it on a cache miss.
+    """
+    key = f'menu:{version}'
+    body = cache.get(key)
+    if body is None:
+        foods = Food.objects.prefetch_related('image')
+        body = JSONRenderer().render(FoodListSerializer(foods, many=True).data)
+        cache.set(key, body, MENU_TIMEOUT)
+    return body
+
+
+async def aget_menu_version():
+    version = await MenuVersion.objects.filter(id=MENU_VERSION_ID).values_list('version', flat=True).afirst()
+    if version is None:
+        version = await sync_to_async(get_menu_version)()
+    return version
+
+
+async def aget_menu_bytes(version):
+    """
+    Async get_menu_bytes: a cache hit does not leave the event loop to build the menu.
+    """
+    body = await cache.aget(f'menu:{version}')
+    if body is None:
+        body = await sync_to_async(get_menu_bytes)(version)
+    return body
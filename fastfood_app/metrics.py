@@ -0,0 +1,189 @@
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10) # seconds
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576) # bytes
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+UNMATCHED_ROUTE = '<unmatched>'
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+current_queries = ContextVar('current_queries', default=None)
+
+
+class QueryStats:
+    __slots__ = ('count', 'duration')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper timing queries of sampled requests; other queries only pay for the context lookup.
+    """
+    stats = current_queries.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.duration += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield bound, cumulative
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.query_time = Histogram(LATENCY_BUCKETS)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """
+    Per-route request metrics of this process. Latency and size are recorded for every request;
+    query counts and time only for the METRICS_SAMPLE_RATE share of requests that were sampled.
+    """
+    families = [
+        ('fastfood_http_request_duration_seconds', 'latency', 'Time spent producing the response.'),
+        ('fastfood_http_response_size_bytes', 'size', 'Size of non-streaming response bodies.'),
+        ('fastfood_db_queries', 'queries', 'SQL queries per request, for sampled requests.'),
+        ('fastfood_db_query_duration_seconds', 'query_time', 'Time spent in SQL per request, for sampled requests.'),
+    ]
+
+    def __init__(self):
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def observe(self, method, route, status, duration, size=None, queries=None):
+        key = (method, route, status)
+        with self.lock:
+            metrics = self.routes.get(key)
+            if metrics is None:
+                metrics = self.routes[key] = RouteMetrics()
+            metrics.latency.observe(duration)
+            if size is not None:
+                metrics.size.observe(size)
+            if queries is not None:
+                metrics.queries.observe(queries.count)
+                metrics.query_time.observe(queries.duration)
+
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+
+    def render(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        with self.lock:
+            routes = sorted(self.routes.items())
+            lines = []
+            for name, attr, help_text in self.families:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (method, route, status), metrics in routes:
+                    histogram = getattr(metrics, attr)
+                    if not histogram.count:
+                        continue
+                    labels = f'method="{escape_label(method)}",route="{escape_label(route)}",status="{status}"'
+                    for bound, count in histogram.samples():
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics_registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """
+    Record latency, response size and, for sampled requests, SQL query count and time of every route,
+    adding them to sampled responses as a Server-Timing header when METRICS_SERVER_TIMING is on.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        queries, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                current_queries.reset(token)
+        self.finish(request, response, started, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                current_queries.reset(token)
+        self.finish(request, response, started, queries)
+        return response
+
+    def start(self):
+        queries = token = None
+        if random.random() < settings.METRICS_SAMPLE_RATE:
+            queries = QueryStats()
+            token = current_queries.set(queries)
+        return queries, token, time.perf_counter()
+
+    def finish(self, request, response, started, queries):
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        route = match.route if match is not None else UNMATCHED_ROUTE
+        size = None if response.streaming else len(response.content)
+        method = request.method if request.method in METHODS else 'OTHER'
+        metrics_registry.observe(method, route, response.status_code, duration, size, queries)
+        if queries is not None and settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = (f'app;dur={duration * 1000:.1f}, '
+                                         f'db;dur={queries.duration * 1000:.1f};desc="{queries.count} queries"')
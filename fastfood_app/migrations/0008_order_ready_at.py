@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastfood_app', '0006_order_assigned_officiant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='ready_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:23
+
+from math import floor
+
+from django.db import migrations, models
+
+GEO_CELL_DEGREES = 0.1
+
+
+def geo_cell(lat, long):
+    # copy of fastfood_app.models.geo_cell at this migration, so later changes to it do not alter history
+    return f"{floor(lat / GEO_CELL_DEGREES)}:{floor(long / GEO_CELL_DEGREES)}"
+
+
+def fill_geo_cells(apps, schema_editor):
+    Food = apps.get_model('fastfood_app', 'Food')
+    foods = list(Food.objects.only('id', 'address_lat_a', 'address_long_a'))
+    for food in foods:
+        food.geo_cell = geo_cell(food.address_lat_a, food.address_long_a)
+    Food.objects.bulk_update(foods, ['geo_cell'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastfood_app', '0008_order_ready_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='geo_cell',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(fill_geo_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce
+
+
+def link_rates_to_foods(apps, schema_editor):
+    Food = apps.get_model('fastfood_app', 'Food')
+    Rate = apps.get_model('fastfood_app', 'Rate')
+    seen = set()
+    for link in Food.ratings.through.objects.order_by('-rate_id').iterator():
+        rate = Rate.objects.filter(id=link.rate_id, food__isnull=True).first()
+        if rate is None:
+            continue
+        if (rate.user_id, link.food_id) in seen:
+            rate.delete()
+            continue
+        seen.add((rate.user_id, link.food_id))
+        rate.food_id = link.food_id
+        rate.save(update_fields=['food'])
+    Rate.objects.filter(food__isnull=True).delete()
+
+    rates = Rate.objects.filter(food=OuterRef('pk')).values('food')
+    Food.objects.update(
+        rating_sum=Coalesce(Subquery(rates.annotate(total=Sum('rate')).values('total')), 0),
+        overal_rated_users=Coalesce(Subquery(rates.annotate(total=Count('id')).values('total')), 0),
+    )
+    Food.objects.filter(overal_rated_users__gt=0).update(
+        overal_rating=Cast(F('rating_sum'), FloatField()) / F('overal_rated_users'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastfood_app', '0009_geo_cell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rate',
+            name='food',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rates', to='fastfood_app.food'),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='rating_sum',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(link_rates_to_foods, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='food',
+            name='ratings',
+        ),
+        migrations.AlterField(
+            model_name='rate',
+            name='food',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rates', to='fastfood_app.food'),
+        ),
+        migrations.AddConstraint(
+            model_name='rate',
+            constraint=models.UniqueConstraint(fields=('user', 'food'), name='unique_user_food_rate'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:30
+
+import django.db.models.deletion
+import fastfood_app.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastfood_app', '0010_rate_food'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=fastfood_app.models.get_periods, max_length=5)),
+                ('period_start', models.DateField()),
+                ('sold_number', models.BigIntegerField(default=0)),
+                ('total_income', models.BigIntegerField(default=0)),
+                ('food', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='fastfood_app.food')),
+                ('responsible', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(fields=('period', 'period_start', 'responsible', 'food'), name='unique_sales_rollup'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastfood_app', '0011_salesrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='delivered',
+            index=models.Index(fields=['responsible', 'date'], name='delivered_responsible_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='delivered',
+            index=models.Index(fields=['date', 'id'], name='delivered_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'date'], name='order_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['assigned_officiant', 'delivered', 'date'], name='order_officiant_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('assigned_officiant__isnull', True), ('delivered', False)), fields=['date', 'id'], name='order_unassigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('delivered', False), ('food_on_the_way', False)), fields=['date', 'id'], name='order_kitchen_idx'),
+        ),
+    ]
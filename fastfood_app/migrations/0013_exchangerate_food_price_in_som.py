@@ -0,0 +1,39 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:34
+
+import fastfood_app.models
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast, Floor
+
+
+def fill_price_in_som(apps, schema_editor):
+    Food = apps.get_model('fastfood_app', 'Food')
+    for valyuta, rate in settings.EXCHANGE_RATES.items():
+        Food.objects.filter(valyuta=valyuta).update(
+            price_in_som=Cast(Floor(F('price') * rate), models.BigIntegerField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastfood_app', '0012_order_delivered_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valyuta', models.CharField(choices=fastfood_app.models.get_valyutas, max_length=5, unique=True)),
+                ('rate', models.FloatField(default=1)),
+                ('date', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='price_in_som',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(fill_price_in_som, migrations.RunPython.noop),
+    ]
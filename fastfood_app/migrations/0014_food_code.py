@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastfood_app', '0013_exchangerate_food_price_in_som'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='code',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastfood_app', '0014_food_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
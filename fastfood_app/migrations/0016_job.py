@@ -0,0 +1,37 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:40
+
+import django.utils.timezone
+import fastfood_app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastfood_app', '0015_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('key', models.CharField(blank=True, max_length=200, null=True)),
+                ('status', models.CharField(choices=fastfood_app.models.get_job_statuses, default='pending', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('date', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['run_at', 'id'], name='job_pending_idx'), models.Index(condition=models.Q(('status', 'running')), fields=['locked_at'], name='job_running_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('key',), name='unique_pending_job_key'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.2 on 2026-10-17 23:11
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+# copies of fastfood_app.scheduler settings at this migration
+SLOT_SECONDS = 5 * 60
+DISHES_PER_SLOT = 4
+TIMELINE_LOCK = -1
+
+
+def book_pending_orders(apps, schema_editor):
+    """
+    Book kitchen slots for orders still waiting for the kitchen, in queue order from the current slot.
+    """
+    Order = apps.get_model('fastfood_app', 'Order')
+    KitchenSlot = apps.get_model('fastfood_app', 'KitchenSlot')
+    now = datetime.now(timezone.utc)
+    slot = int(now.timestamp()) // SLOT_SECONDS
+    dishes = 0
+    orders = list(Order.objects.filter(delivered=False, food_on_the_way=False)
+                  .exclude(ready_at__lte=now).order_by('date', 'id').only('id', 'count'))
+    timeline = {}
+    for order in orders:
+        order.kitchen_slots = []
+        count = order.count
+        while count > 0:
+            taken = min(count, DISHES_PER_SLOT - dishes)
+            order.kitchen_slots.append([slot, taken])
+            timeline[slot] = dishes = dishes + taken
+            count -= taken
+            if dishes == DISHES_PER_SLOT:
+                slot, dishes = slot + 1, 0
+        booked = order.kitchen_slots[-1][0] if order.kitchen_slots else slot
+        order.ready_at = datetime.fromtimestamp((booked + 1) * SLOT_SECONDS, tz=timezone.utc)
+    Order.objects.bulk_update(orders, ['kitchen_slots', 'ready_at'], batch_size=500)
+    KitchenSlot.objects.bulk_create([KitchenSlot(slot=TIMELINE_LOCK)] +
+                                    [KitchenSlot(slot=number, dishes=booked) for number, booked in timeline.items()],
+                                    batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastfood_app', '0016_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KitchenSlot',
+            fields=[
+                ('slot', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('dishes', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='kitchen_slots',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(book_pending_orders, migrations.RunPython.noop),
+    ]
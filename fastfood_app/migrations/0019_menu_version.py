@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-17 23:14
+
+import time
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastfood_app', '0017_kitchen_slots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=time.time_ns)),
+            ],
+        ),
+    ]
@@ -1,9 +1,10 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.contrib.auth.models import BaseUserManager
-from django.contrib.auth.hashers import make_password
-from django.conf import settings
-import os
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, identify_hasher
+from django.utils import timezone
+from math import floor
+import time
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, username, role='user', tel_number='', address='', password=None, **extra_fields):
@@ -33,11 +34,25 @@ class User(AbstractUser):
         return self.username
     
     def save(self, *args, **kwargs):
-        if not self.password.startswith('pbkdf2_sha256$'): self.password = make_password(self.password)
+        if not is_password_hash(self.password): self.set_password(self.password)
         super().save(*args, **kwargs)
 
+def is_password_hash(password):
+    """
+    Whether password is already a hash of one of PASSWORD_HASHERS or an unusable password, so it is never hashed twice.
+    """
+    if password is None or password.startswith(UNUSABLE_PASSWORD_PREFIX):
+        return True
+    try:
+        identify_hasher(password).decode(password)
+    except (ValueError, TypeError, KeyError):
+        return False
+    return True
+
 class Image(models.Model):
     image = models.ImageField(upload_to='food_images/', blank=True, null=True)
+    content_hash = models.CharField(max_length=64, unique=True, blank=True, null=True, editable=False) # sha256 of the upload
+    variants = models.JSONField(default=dict, blank=True, editable=False) # thumbnail and resized copies
     date = models.DateTimeField(auto_now_add=True)
 
     def __str__(self) -> str:
@@ -46,36 +61,85 @@ class Image(models.Model):
 class Rate(models.Model):
     rate = models.IntegerField(default=5)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    food = models.ForeignKey('Food', on_delete=models.CASCADE, related_name='rates')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'food'], name='unique_user_food_rate'),
+        ]
 
     def __str__(self) -> str:
         return str(self.rate)
 
+GEO_CELL_DEGREES = 0.1
+
+def geo_cell(lat, long):
+    """
+    Grid cell of a point, GEO_CELL_DEGREES wide on both axes.
+    """
+    return f"{floor(lat / GEO_CELL_DEGREES)}:{floor(long / GEO_CELL_DEGREES)}"
+
 def get_valyutas():
     return {'usd': 'Usd', 'som': "So'm", 'rubl': "rubl"}
 
+class ExchangeRate(models.Model):
+    valyuta = models.CharField(max_length=5, choices=get_valyutas, unique=True)
+    rate = models.FloatField(default=1) # so'm per unit
+    date = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.valyuta}: {self.rate}"
+
+class ExchangeRateVersion(models.Model):
+    version = models.BigIntegerField(default=time.time_ns) # moves on with every set_exchange_rates
+
+    def __str__(self) -> str:
+        return str(self.version)
+
 class Food(models.Model):
+    code = models.CharField(max_length=64, unique=True, blank=True, null=True) # menu import key
     name = models.CharField(max_length=150, blank=True, null=True)
     price = models.IntegerField(default=0)
     valyuta = models.CharField(max_length=5, choices=get_valyutas, default='som')
+    price_in_som = models.BigIntegerField(default=0, editable=False, db_index=True)
     image = models.ManyToManyField(Image, blank=True)
-    overal_rating = models.FloatField(default=0)
+    overal_rating = models.FloatField(default=0) # rating_sum / overal_rated_users
     overal_rated_users = models.IntegerField(default=0)
-    ratings = models.ManyToManyField(Rate, blank=True)
+    rating_sum = models.BigIntegerField(default=0)
     address_lat_a = models.FloatField(default=40.84116287658114)
     address_long_a = models.FloatField(default=72.32745981241342)
+    geo_cell = models.CharField(max_length=32, blank=True, default='', editable=False, db_index=True)
     description = models.TextField(max_length=1000, blank=True, null=True)
     date = models.DateTimeField(auto_now_add=True)
 
     def __str__(self) -> str:
         return self.name
 
+    def save(self, *args, **kwargs):
+        from .currency import to_som
+        self.geo_cell = geo_cell(self.address_lat_a, self.address_long_a)
+        self.price_in_som = to_som(self.price, self.valyuta)
+        super().save(*args, **kwargs)
+
     def delete(self, *args, **kwargs):
-        for image in self.image.all():
-            file_path = os.path.join(settings.MEDIA_ROOT, str(image.image))
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        from .images import image_file_names
+        from .jobs import enqueue
+        shared = Food.image.through.objects.filter(image__food=self).exclude(food=self).values('image_id')
+        names, content_hashes = [], []
+        for image in self.image.exclude(id__in=shared):
+            names.extend(image_file_names(image))
+            if image.content_hash:
+                content_hashes.append(image.content_hash)
             image.delete()
         super().delete(*args, **kwargs)
+        if names:
+            enqueue('delete_files', {'names': names, 'content_hashes': content_hashes})
+
+class MenuVersion(models.Model):
+    version = models.BigIntegerField(default=time.time_ns) # starts from the clock, so a new row never reuses a cached menu
+
+    def __str__(self) -> str:
+        return str(self.version)
 
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -84,11 +148,30 @@ class Order(models.Model):
     address_lat_a = models.FloatField(default=40.84411221242592)
     address_long_a = models.FloatField(default=72.33245510501874)
     estimate_date = models.IntegerField(default=30) # in minute
+    ready_at = models.DateTimeField(blank=True, null=True) # kitchen ready time
+    kitchen_slots = models.JSONField(default=list, blank=True, editable=False) # [[slot, dishes], ...] booked in KitchenSlot
     delivered = models.BooleanField(default=False)
     food_on_the_way = models.BooleanField(default=False)
     assigned_officiant = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_orders')
     date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='order_user_date_idx'),
+            models.Index(fields=['assigned_officiant', 'delivered', 'date'], name='order_officiant_date_idx'),
+            models.Index(fields=['date', 'id'], name='order_unassigned_idx',
+                         condition=models.Q(assigned_officiant__isnull=True, delivered=False)),
+            models.Index(fields=['date', 'id'], name='order_kitchen_idx',
+                         condition=models.Q(delivered=False, food_on_the_way=False)),
+        ]
+
+class KitchenSlot(models.Model):
+    slot = models.BigIntegerField(primary_key=True) # number of SLOT_MINUTES periods since the unix epoch
+    dishes = models.IntegerField(default=0) # dishes booked in the slot
+
+    def __str__(self) -> str:
+        return f"{self.slot}: {self.dishes}"
+
 def spacecomma(value):
     res = ''
     money = str(value)[::-1]
@@ -103,6 +186,56 @@ class Delivered(models.Model):
     total_income = models.BigIntegerField(default=0) # in so'm
     date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['responsible', 'date'], name='delivered_responsible_date_idx'),
+            models.Index(fields=['date', 'id'], name='delivered_date_idx'),
+        ]
+
     def __str__(self) -> str:
         return f"{self.food}: {spacecomma(self.total_income)}"
 
+def get_periods():
+    return {'day': 'Day', 'month': 'Month'}
+
+class SalesRollup(models.Model):
+    period = models.CharField(max_length=5, choices=get_periods)
+    period_start = models.DateField()
+    responsible = models.ForeignKey(User, on_delete=models.CASCADE)
+    food = models.ForeignKey(Food, on_delete=models.CASCADE)
+    sold_number = models.BigIntegerField(default=0)
+    total_income = models.BigIntegerField(default=0) # in so'm
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'period_start', 'responsible', 'food'], name='unique_sales_rollup'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.period} {self.period_start} {self.food}: {spacecomma(self.total_income)}"
+
+def get_job_statuses():
+    return {'pending': 'Pending', 'running': 'Running', 'failed': 'Failed'}
+
+class Job(models.Model):
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    key = models.CharField(max_length=200, blank=True, null=True) # idempotency key
+    status = models.CharField(max_length=10, choices=get_job_statuses, default='pending')
+    attempts = models.IntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default='')
+    date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['run_at', 'id'], name='job_pending_idx', condition=models.Q(status='pending')),
+            models.Index(fields=['locked_at'], name='job_running_idx', condition=models.Q(status='running')),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['key'], name='unique_pending_job_key', condition=models.Q(status='pending')),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.status})"
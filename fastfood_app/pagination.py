@@ -0,0 +1,145 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
+
+
+class DateCursorPagination(BasePagination):
+    """
+    Keyset pagination over (date, id), newest first.
+
+    Only used when the request asks for it with ?cursor= or ?page_size=,
+    so clients reading the plain list keep working.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+    descending = True
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, item):
+        value = f"{item.date.isoformat()}|{item.id}"
+        return urlsafe_b64encode(value.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            date, id = urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(date), int(id)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.get_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.get_page([item async for item in queryset])
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Order and filter the queryset from the cursor, fetching one extra row to tell if there is a next page.
+        """
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.size = size = self.get_page_size(request)
+        if self.descending:
+            queryset = queryset.order_by('-date', '-id')
+        else:
+            queryset = queryset.order_by('date', 'id')
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            date, id = self.decode_cursor(cursor)
+            if self.descending:
+                queryset = queryset.filter(Q(date__lt=date) | Q(date=date, id__lt=id))
+            else:
+                queryset = queryset.filter(Q(date__gt=date) | Q(date=date, id__gt=id))
+
+        return queryset[:size + 1]
+
+    def get_page(self, page):
+        size = self.size
+        self.next_cursor = self.encode_cursor(page[size - 1]) if len(page) > size else None
+        return page[:size]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_data(self, data):
+        return {'next': self.get_next_link(), 'results': data}
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class OldestFirstCursorPagination(DateCursorPagination):
+    """
+    Keyset pagination over (date, id), oldest first.
+    """
+    descending = False
+
+
+def wants_ndjson(request):
+    return request.query_params.get('stream') == 'ndjson'
+
+
+def stream_ndjson(queryset, serializer_class, chunk_size=500):
+    """
+    Stream a queryset as newline-delimited JSON, one serialized row per line.
+    """
+    def rows():
+        for item in queryset.iterator(chunk_size=chunk_size):
+            yield json.dumps(serializer_class(item).data, cls=JSONEncoder) + '\n'
+
+    return StreamingHttpResponse(rows(), content_type='application/x-ndjson')
@@ -0,0 +1,47 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce
+from .models import Food, Rate
+from .menu import bump_menu_version
+
+
+def rate_food(food_id, user, rate):
+    """
+    Create or change a user's rate of a food and move the food totals by the difference.
+    """
+    with transaction.atomic():
+        rates = Rate.objects.filter(food_id=food_id, user=user)
+        old_rate = rates.select_for_update().values_list('rate', flat=True).first()
+        if old_rate is None:
+            try:
+                with transaction.atomic():
+                    Rate.objects.create(food_id=food_id, user=user, rate=rate)
+            except IntegrityError:
+                old_rate = rates.select_for_update().values_list('rate', flat=True).get()
+        if old_rate is not None:
+            rates.update(rate=rate)
+
+        sum_delta = rate - (old_rate or 0)
+        count_delta = 0 if old_rate is not None else 1
+        Food.objects.filter(id=food_id).update(
+            rating_sum=F('rating_sum') + sum_delta,
+            overal_rated_users=F('overal_rated_users') + count_delta,
+            overal_rating=Cast(F('rating_sum') + sum_delta, FloatField()) / (F('overal_rated_users') + count_delta),
+        )
+        if old_rate is not None:
+            transaction.on_commit(bump_menu_version) # a new Rate row bumps it through post_save
+
+
+def recompute_ratings():
+    """
+    Rebuild rating totals of every food from its Rate rows.
+    """
+    rates = Rate.objects.filter(food=OuterRef('pk')).values('food')
+    with transaction.atomic():
+        updated = Food.objects.update(
+            rating_sum=Coalesce(Subquery(rates.annotate(total=Sum('rate')).values('total')), 0),
+            overal_rated_users=Coalesce(Subquery(rates.annotate(total=Count('id')).values('total')), 0),
+            overal_rating=Coalesce(Subquery(rates.annotate(total=Avg('rate')).values('total')), Value(0.0)),
+        )
+        transaction.on_commit(bump_menu_version)
+    return updated
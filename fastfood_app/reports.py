@@ -0,0 +1,80 @@
+from collections import defaultdict
+from datetime import date
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDay, TruncMonth
+from django.utils import timezone
+from .models import Delivered, SalesRollup
+
+
+def get_period_starts(moment):
+    day = timezone.localdate(moment)
+    return (('day', day), ('month', day.replace(day=1)))
+
+
+def record_sales(delivered_rows):
+    """
+    Add Delivered rows to their daily and monthly rollups.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for delivered in delivered_rows:
+        for period, period_start in get_period_starts(delivered.date):
+            total = totals[(period, period_start, delivered.responsible_id, delivered.food_id)]
+            total[0] += delivered.sold_number
+            total[1] += delivered.total_income
+
+    for (period, period_start, responsible_id, food_id), (sold_number, total_income) in totals.items():
+        rollup = SalesRollup.objects.filter(period=period, period_start=period_start,
+                                            responsible_id=responsible_id, food_id=food_id)
+        changes = {
+            'sold_number': F('sold_number') + sold_number,
+            'total_income': F('total_income') + total_income,
+        }
+        if rollup.update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                SalesRollup.objects.create(period=period, period_start=period_start,
+                                           responsible_id=responsible_id, food_id=food_id,
+                                           sold_number=sold_number, total_income=total_income)
+        except IntegrityError:
+            rollup.update(**changes)
+
+
+def rebuild_sales_rollups():
+    """
+    Rebuild all rollups from the Delivered table.
+    """
+    rollups = []
+    for period, trunc in (('day', TruncDay), ('month', TruncMonth)):
+        rows = (Delivered.objects.annotate(period_start=trunc('date'))
+                .values('period_start', 'responsible_id', 'food_id')
+                .annotate(sold=Sum('sold_number'), income=Sum('total_income'))
+                .order_by())
+        for row in rows.iterator():
+            rollups.append(SalesRollup(period=period, period_start=timezone.localdate(row['period_start']),
+                                       responsible_id=row['responsible_id'], food_id=row['food_id'],
+                                       sold_number=row['sold'], total_income=row['income']))
+    with transaction.atomic():
+        SalesRollup.objects.all().delete()
+        SalesRollup.objects.bulk_create(rollups, batch_size=500)
+    return len(rollups)
+
+
+def get_sales_report(year, month, responsible=None):
+    """
+    Monthly sales totals per food, read from the monthly rollups.
+    """
+    rollups = SalesRollup.objects.filter(period='month', period_start=date(year, month, 1))
+    if responsible is not None:
+        rollups = rollups.filter(responsible=responsible)
+    foods = list(rollups.values('food', name=F('food__name'))
+                 .annotate(sold_number=Sum('sold_number'), total_income=Sum('total_income'))
+                 .order_by('-total_income'))
+    return {
+        'year': year,
+        'month': month,
+        'sold_number': sum(food['sold_number'] for food in foods),
+        'total_income': sum(food['total_income'] for food in foods),
+        'foods': foods,
+    }
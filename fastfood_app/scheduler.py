@@ -0,0 +1,131 @@
+from datetime import datetime, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import KitchenSlot
+
+SLOT_MINUTES = 5
+DISHES_PER_SLOT = 4
+TIMELINE_LOCK = -1 # row every writer of the timeline locks first; never a real slot
+
+
+class KitchenScheduler:
+    """
+    Timeline of kitchen slots. Each slot lasts SLOT_MINUTES and cooks up to
+    DISHES_PER_SLOT dishes; an order takes the earliest free capacity.
+
+    Slots are numbered from the unix epoch and their booked dishes are kept in
+    KitchenSlot rows, so every process books against the same capacity. Every
+    writer locks the TIMELINE_LOCK row first, so bookings never race each other
+    and recompute_estimates can rebuild the whole table at once.
+    """
+    def __init__(self, slot_minutes=SLOT_MINUTES, dishes_per_slot=DISHES_PER_SLOT):
+        self.slot_seconds = slot_minutes * 60
+        self.dishes_per_slot = dishes_per_slot
+
+    def slot_of(self, moment):
+        return int(moment.timestamp()) // self.slot_seconds
+
+    def slot_end(self, slot):
+        return datetime.fromtimestamp((slot + 1) * self.slot_seconds, tz=dt_timezone.utc)
+
+    def lock(self):
+        """
+        Lock the timeline until the end of the transaction; run it before locking any order.
+        """
+        locked = KitchenSlot.objects.select_for_update().filter(slot=TIMELINE_LOCK)
+        if not locked.exists():
+            KitchenSlot.objects.bulk_create([KitchenSlot(slot=TIMELINE_LOCK)], ignore_conflicts=True)
+            locked.exists()
+
+    def next_open_slot(self, start):
+        """
+        Return the first slot from start on that is not full, in one query; slots without a row are empty.
+
+        Past a booked start, the first open slot is either a booked slot with room left or the one after
+        the last booked slot of the run, so the query looks for the first row of either kind.
+        """
+        row = (KitchenSlot.objects.filter(slot__gte=start)
+               .filter(Q(dishes__lt=self.dishes_per_slot) | ~Exists(KitchenSlot.objects.filter(slot=OuterRef('slot') + 1)))
+               .annotate(start_booked=Exists(KitchenSlot.objects.filter(slot=start)))
+               .order_by('slot').values_list('slot', 'dishes', 'start_booked').first())
+        if row is None or not row[2]:
+            return start
+        slot, dishes, _ = row
+        return slot if dishes < self.dishes_per_slot else slot + 1
+
+    def reserve(self, count, now=None):
+        """
+        Take capacity for `count` dishes and return the booking as a list of [slot, dishes].
+        Run it in the transaction saving the booking, so a failure gives the capacity back.
+
+        The slots from the first open one on are read and written in bulk, a window of `count` slots at a time.
+        """
+        slot = self.slot_of(now or timezone.now())
+        booking = []
+        with transaction.atomic():
+            self.lock()
+            while count > 0:
+                slot = self.next_open_slot(slot)
+                end = slot + count
+                rows = {row.slot: row for row in KitchenSlot.objects.filter(slot__gte=slot, slot__lt=end)}
+                taken = self.pack({number: row.dishes for number, row in rows.items()}, count, slot, end)
+                new_rows = []
+                for number, dishes in taken:
+                    if number in rows:
+                        rows[number].dishes += dishes
+                    else:
+                        new_rows.append(KitchenSlot(slot=number, dishes=dishes))
+                KitchenSlot.objects.bulk_update([rows[number] for number, _ in taken if number in rows], ['dishes'])
+                KitchenSlot.objects.bulk_create(new_rows)
+                booking += taken
+                count -= sum(dishes for _, dishes in taken)
+                slot = end
+        return booking
+
+    def pack(self, timeline, count, start, end=None):
+        """
+        Book `count` dishes in a {slot: dishes} timeline kept in memory, from slot start on, and return the booking.
+        Stop before slot `end` when given.
+        """
+        slot = start
+        booking = []
+        while count > 0 and (end is None or slot < end):
+            taken = min(count, self.dishes_per_slot - timeline.get(slot, 0))
+            if taken > 0:
+                timeline[slot] = timeline.get(slot, 0) + taken
+                booking.append([slot, taken])
+                count -= taken
+            slot += 1
+        return booking
+
+    def ready_time(self, booking):
+        return self.slot_end(booking[-1][0]) if booking else timezone.now()
+
+    def cancel(self, booking):
+        """
+        Give back capacity of a booking.
+        """
+        with transaction.atomic():
+            self.lock()
+            for slot, dishes in booking:
+                KitchenSlot.objects.filter(slot=slot).update(dishes=Greatest(F('dishes') - dishes, 0))
+
+    def release(self, order):
+        """
+        Free the slots of an order which left the kitchen.
+        """
+        self.cancel(order.kitchen_slots)
+        order.kitchen_slots = []
+
+    def rewrite(self, timeline):
+        """
+        Replace every slot row with a {slot: dishes} timeline; run it holding the lock.
+        """
+        KitchenSlot.objects.filter(slot__gte=0).delete()
+        KitchenSlot.objects.bulk_create([KitchenSlot(slot=slot, dishes=dishes) for slot, dishes in sorted(timeline.items())],
+                                        batch_size=500)
+
+
+kitchen_scheduler = KitchenScheduler()
@@ -0,0 +1,86 @@
+import random
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from .calculations import recompute_estimates
+from .currency import get_exchange_rates, to_som
+from .menu import bump_menu_version
+from .models import User, Image, Food, Order, geo_cell
+
+SEED_PREFIX = 'seed-'
+SEED_PASSWORD = 'Seed-pass-2024!'
+BATCH_SIZE = 1000
+CENTER = (40.8411, 72.3274) # around the default food address
+
+
+def seed_username(role, number):
+    return f'{SEED_PREFIX}{role}-{number}'
+
+
+def near(rng, spread=0.05):
+    return CENTER[0] + rng.uniform(-spread, spread), CENTER[1] + rng.uniform(-spread, spread)
+
+
+def clear_seed_data():
+    """
+    Delete rows made by seed_data, leaving everything else alone.
+    """
+    with transaction.atomic():
+        Order.objects.filter(user__username__startswith=SEED_PREFIX).delete()
+        Food.objects.filter(code__startswith=SEED_PREFIX).delete()
+        Image.objects.filter(image__startswith=f'food_images/{SEED_PREFIX}').delete()
+        User.objects.filter(username__startswith=SEED_PREFIX).delete()
+
+
+def seed_data(users, ofitsiants, foods, images, orders, seed=0):
+    """
+    Replace earlier seed rows with a reproducible data set: the same arguments and seed always give the same rows.
+    Users log in with SEED_PASSWORD; images point at files that are never written.
+    """
+    rng = random.Random(seed)
+    password = make_password(SEED_PASSWORD)
+    with transaction.atomic():
+        clear_seed_data()
+        User.objects.bulk_create([
+            User(username=seed_username(role, number), password=password, role=role)
+            for role, count in (('user', users), ('ofitsiant', ofitsiants))
+            for number in range(count)
+        ], batch_size=BATCH_SIZE)
+
+        image_rows = Image.objects.bulk_create([
+            Image(image=f'food_images/{SEED_PREFIX}{number}.jpg') for number in range(images)
+        ], batch_size=BATCH_SIZE)
+
+        rates = get_exchange_rates()
+        food_rows = []
+        for number in range(foods):
+            lat, long = near(rng)
+            price = rng.randrange(10, 200) * 1000
+            food_rows.append(Food(
+                code=f'{SEED_PREFIX}{number}', name=f'Food {number}', price=price, price_in_som=to_som(price, 'som', rates),
+                address_lat_a=lat, address_long_a=long, geo_cell=geo_cell(lat, long),
+            ))
+        food_rows = Food.objects.bulk_create(food_rows, batch_size=BATCH_SIZE)
+        if image_rows:
+            Food.image.through.objects.bulk_create([
+                Food.image.through(food=food, image=rng.choice(image_rows)) for food in food_rows
+            ], batch_size=BATCH_SIZE)
+
+        customers = list(User.objects.filter(username__startswith=f'{SEED_PREFIX}user-').order_by('id'))
+        staff = list(User.objects.filter(username__startswith=f'{SEED_PREFIX}ofitsiant-').order_by('id'))
+        order_rows = []
+        if customers and food_rows:
+            for _ in range(orders):
+                lat, long = near(rng)
+                order_rows.append(Order(
+                    user=rng.choice(customers), food=rng.choice(food_rows), count=rng.randint(1, 4),
+                    address_lat_a=lat, address_long_a=long,
+                    assigned_officiant=rng.choice(staff) if staff and rng.random() < 0.3 else None,
+                ))
+            Order.objects.bulk_create(order_rows, batch_size=BATCH_SIZE)
+
+        recompute_estimates()
+        transaction.on_commit(bump_menu_version)
+    return {
+        'users': len(customers), 'ofitsiants': len(staff), 'foods': len(food_rows),
+        'images': len(image_rows), 'orders': len(order_rows),
+    }
@@ -1,6 +1,13 @@
+from django.db import transaction
+from django.core.files.storage import default_storage
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from .models import User, Food, Image, Rate, Order, Delivered
-from.calculations import get_distance, estimate_time
+from .calculations import get_distance, get_distances, estimate_time
+from .scheduler import kitchen_scheduler
+from .images import save_images
+from .authentication import RoleRefreshToken
 
 
 class UserControlSerializer(serializers.ModelSerializer):
@@ -9,6 +16,10 @@ class UserControlSerializer(serializers.ModelSerializer):
         fields = ('id', 'username', 'password', 'role', 'first_name', 'last_name', 'tel_number', 'address')
 
 
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RoleRefreshToken
+
+
 class UserInfoSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -38,9 +49,25 @@ class EditUserSerializer(serializers.ModelSerializer):
 
 
 class ImageSerializer(serializers.ModelSerializer):
+    thumbnail = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Image
-        fields = ('id', 'image')
+        fields = ('id', 'image', 'thumbnail', 'srcset')
+
+    def get_thumbnail(self, obj) -> str:
+        name = obj.variants.get('thumbnail')
+        return default_storage.url(name) if name else None
+
+    def get_srcset(self, obj) -> dict:
+        """
+        srcset strings per format, empty until the variants are built.
+        """
+        return {
+            format: ', '.join(f"{default_storage.url(name)} {width}w" for width, name in variants.items())
+            for format, variants in obj.variants.items() if format != 'thumbnail'
+        }
 
 
 class RateSerializer(serializers.ModelSerializer):
@@ -62,7 +89,7 @@ class FoodListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Food
-        fields = ['id', 'name', 'price', 'valyuta', 'overal_rating', 'overal_rated_users', 'address_lat_a', 'address_long_a', 'image']
+        fields = ['id', 'name', 'price', 'valyuta', 'price_in_som', 'overal_rating', 'overal_rated_users', 'address_lat_a', 'address_long_a', 'image']
 
 
 class FoodCreateSerializer(serializers.ModelSerializer):
@@ -75,21 +102,34 @@ class FoodCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         images_data = validated_data.pop('images', [])
         food = Food.objects.create(**validated_data)
-        for image_data in images_data:
-            try:
-                image = Image.objects.create(image=image_data)
-                food.image.add(image)
-            except Exception as e:
-                print(e)
+        food.image.add(*save_images(images_data))
         return food
 
 
+class FoodImportSerializer(serializers.ModelSerializer):
+    """
+    Serializer for one row of a menu import, matched to existing foods by code.
+    """
+    code = serializers.CharField(max_length=64)
+    images = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    class Meta:
+        model = Food
+        fields = ['code', 'name', 'price', 'valyuta', 'address_lat_a', 'address_long_a', 'description', 'images']
+
+    def to_internal_value(self, data):
+        images = data.get('images')
+        if isinstance(images, str):
+            data = {**data, 'images': [image for image in images.replace(';', ',').split(',') if image.strip()]}
+        return super().to_internal_value({key: value for key, value in data.items() if value not in ('', None)})
+
+
 class OfitsiantOrderSerializer(serializers.ModelSerializer):
     food = FoodListSerializer()
 
     class Meta:
         model = Order
-        fields = ('id', 'user', 'food', 'count', 'address_lat_a', 'address_long_a', 'estimate_date', 'assigned_officiant', 'delivered', 'food_on_the_way', 'date')
+        fields = ('id', 'user', 'food', 'count', 'address_lat_a', 'address_long_a', 'estimate_date', 'ready_at', 'assigned_officiant', 'delivered', 'food_on_the_way', 'date')
 
 
 class ListUserOrderSerializer(serializers.ModelSerializer):
@@ -97,16 +137,16 @@ class ListUserOrderSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Order
-        fields = ('id', 'user', 'food', 'count', 'address_lat_a', 'address_long_a', 'estimate_date', 'delivered', 'food_on_the_way', 'date')
+        fields = ('id', 'user', 'food', 'count', 'address_lat_a', 'address_long_a', 'estimate_date', 'ready_at', 'delivered', 'food_on_the_way', 'date')
 
 
 class CreateUserOrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
-        fields = ('food', 'count', 'address_lat_a', 'address_long_a')
+        fields = ('id', 'food', 'count', 'address_lat_a', 'address_long_a')
         extra_kwargs = {
             'food': {'required': True},
-            'count': {'required': True},
+            'count': {'required': True, 'min_value': 1, 'max_value': 100},
             'address_lat_a': {'required': True},
             'address_long_a': {'required': True},
         }
@@ -120,11 +160,66 @@ class CreateUserOrderSerializer(serializers.ModelSerializer):
         long_a = validated_data['address_long_a']
         validated_data['user'] = self.context['request'].user
         distance = get_distance(lat_a, long_a, lat_b, long_b)
-        validated_data['estimate_date'] = estimate_time(distance=distance, order_count=validated_data['count'])
-        
-        super().create(validated_data)        
-        
-        return validated_data['estimate_date']
+
+        with transaction.atomic():
+            booking = kitchen_scheduler.reserve(validated_data['count'])
+            validated_data['kitchen_slots'] = booking
+            validated_data['ready_at'] = kitchen_scheduler.ready_time(booking)
+            validated_data['estimate_date'] = estimate_time(distance=distance, ready_at=validated_data['ready_at'])
+            return super().create(validated_data)
+
+
+class CartLineSerializer(serializers.Serializer):
+    food = serializers.IntegerField()
+    count = serializers.IntegerField(min_value=1, max_value=100)
+
+
+class CartOrderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = ('id', 'food', 'count')
+
+
+class CreateCartSerializer(serializers.Serializer):
+    """
+    Serializer for ordering several foods to one address at once.
+    """
+    lines = CartLineSerializer(many=True, allow_empty=False, max_length=50)
+    address_lat_a = serializers.FloatField(min_value=-90, max_value=90)
+    address_long_a = serializers.FloatField(min_value=-180, max_value=180)
+
+    def validate(self, attrs):
+        foods = Food.objects.in_bulk({line['food'] for line in attrs['lines']})
+        missing = sorted({line['food'] for line in attrs['lines']} - set(foods))
+        if missing:
+            raise serializers.ValidationError({'lines': f"Food not found: {', '.join(map(str, missing))}"})
+        attrs['foods'] = foods
+        return attrs
+
+    def create(self, validated_data):
+        foods = validated_data['foods']
+        lines = validated_data['lines']
+        lat_a = validated_data['address_lat_a']
+        long_a = validated_data['address_long_a']
+        user = self.context['request'].user
+        now = timezone.now()
+
+        distances = get_distances([(lat_a, long_a)], [(foods[line['food']].address_lat_a, foods[line['food']].address_long_a) for line in lines])
+        with transaction.atomic():
+            bookings = [kitchen_scheduler.reserve(line['count'], now) for line in lines]
+            ready_at = max(kitchen_scheduler.ready_time(booking) for booking in bookings)
+            estimate_date = estimate_time(distance=max(distances), ready_at=ready_at, now=now)
+            orders = Order.objects.bulk_create([
+                Order(user=user, food=foods[line['food']], count=line['count'],
+                      address_lat_a=lat_a, address_long_a=long_a,
+                      estimate_date=estimate_date, ready_at=ready_at, kitchen_slots=booking)
+                for line, booking in zip(lines, bookings)
+            ])
+        return orders
+
+
+class DeliverOrdersSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=500)
 
 
 class DeliveredSerializer(serializers.ModelSerializer):
@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import User, Image, Rate, Food, Order
+from .authentication import user_cache
+from .menu import bump_menu_version
+from .scheduler import kitchen_scheduler
+
+
+@receiver(post_delete, sender=Order)
+def free_kitchen_slots(sender, instance, **kwargs):
+    """
+    Free the kitchen slots of a deleted order.
+    """
+    if not instance.delivered and not instance.food_on_the_way:
+        kitchen_scheduler.release(instance)
+
+
+@receiver(post_save, sender=Food)
+@receiver(post_delete, sender=Food)
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+@receiver(post_save, sender=Rate)
+@receiver(post_delete, sender=Rate)
+@receiver(m2m_changed, sender=Food.image.through)
+def invalidate_menu(sender, **kwargs):
+    """
+    Start a new menu version whenever anything shown on the menu changes.
+    """
+    if kwargs.get('action', 'post_').startswith('post_'):
+        transaction.on_commit(bump_menu_version)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Drop a changed or deleted user from the authentication cache, again after commit
+    in case a request cached the old row meanwhile.
+    """
+    user_cache.discard(instance.pk)
+    transaction.on_commit(lambda: user_cache.discard(instance.pk))
@@ -0,0 +1,81 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from .authentication import AsyncJWTAuthentication
+from .events import OFITSIANTS_CHANNEL, get_broker, order_event, user_channel
+from .models import Order
+
+
+def format_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n"
+
+
+async def authenticate(request):
+    """
+    Return the user of the JWT in the Authorization header or, for EventSource clients, the ?token= parameter.
+    """
+    auth = AsyncJWTAuthentication()
+    raw_token = None if auth.get_header(request) else request.GET.get('token', '').encode() or None
+    try:
+        result = await auth.aauthenticate(request, raw_token)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+    return result[0] if result else None
+
+
+async def stream_events(channels, snapshot_queryset):
+    """
+    Subscribe before reading the snapshot, so no change between the two is missed. Both happen once
+    the response is iterated, and the subscription is closed however the stream ends.
+    """
+    subscription = get_broker().subscribe(channels)
+    try:
+        orders = await sync_to_async(list)(snapshot_queryset.order_by('date', 'id'))
+        yield format_event('snapshot', [order_event(order) for order in orders])
+        while True:
+            try:
+                event = await subscription.get(settings.EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if subscription.lost:
+                subscription.lost = False
+                yield format_event('resync', {})
+            yield format_event('order', event)
+    finally:
+        subscription.close()
+
+
+async def order_events(request, channels, snapshot_queryset):
+    """
+    Server-sent events: a snapshot of the orders, then their deltas as they happen.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"message": "Event streams need the ASGI server"}, status=501)
+    response = StreamingHttpResponse(stream_events(channels, snapshot_queryset), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def user_order_events(request):
+    user = await authenticate(request)
+    if user is None:
+        return JsonResponse({"message": "Authentication credentials were not provided or are invalid"}, status=401)
+    return await order_events(request, [user_channel(user.id)], Order.objects.filter(user=user))
+
+
+async def ofitsiant_order_events(request):
+    user = await authenticate(request)
+    if user is None:
+        return JsonResponse({"message": "Authentication credentials were not provided or are invalid"}, status=401)
+    if user.role not in ('admin', 'ofitsiant'):
+        return JsonResponse({"message": "You do not have permission to perform this action."}, status=403)
+    unassigned = Order.objects.filter(assigned_officiant__isnull=True, delivered=False)
+    return await order_events(request, [OFITSIANTS_CHANNEL], unassigned)
@@ -0,0 +1,30 @@
+from django.core.files.storage import default_storage
+from .calculations import recompute_estimates
+from .images import files_in_use
+from .jobs import task
+from .models import Delivered
+from .reports import record_sales
+
+
+@task('delete_files')
+def delete_files(names, content_hashes=()):
+    """
+    Remove files from storage; names already gone, or used again by an image with one of content_hashes, are skipped.
+    """
+    used = files_in_use(names, content_hashes)
+    for name in names:
+        if name not in used:
+            default_storage.delete(name)
+
+
+@task('recompute_estimates')
+def recompute_order_estimates():
+    recompute_estimates()
+
+
+@task('record_sales')
+def record_delivered_sales(ids):
+    """
+    Add Delivered rows to the sales rollups.
+    """
+    record_sales(Delivered.objects.filter(id__in=ids).only('date', 'responsible_id', 'food_id', 'sold_number', 'total_income'))
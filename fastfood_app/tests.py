@@ -1,3 +1,1026 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import F, Sum
+from unittest import mock, skipUnless
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image as PILImage
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from .authentication import RoleRefreshToken, user_cache
+from .calculations import recompute_estimates
+from .currency import clear_exchange_rates, get_exchange_rates, set_exchange_rates
+from .delivery import deliver_orders
+from .events import get_broker, user_channel
+from .filters import get_date_range
+from .images import image_file_names, process_image, save_images
+from .jobs import TASKS, claim_jobs, enqueue, requeue_stale_jobs, run_job
+from .menu import MENU_VERSION_ID
+from .metrics import metrics_registry
+from .models import User, Image, Food, Order, Delivered, Job, KitchenSlot, MenuVersion, Rate, SalesRollup, ExchangeRate, ExchangeRateVersion, is_password_hash
+from .ratings import rate_food, recompute_ratings
+from .reports import rebuild_sales_rollups, record_sales
+from .scheduler import KitchenScheduler
+from .streams import stream_events
+from .serializers import ImageSerializer
+
+
+class ListQueryCountTests(TestCase):
+    """
+    List endpoints must run the same number of queries however many rows they return.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('user', password='pass12345!')
+        self.ofitsiant = User.objects.create_user('ofitsiant', role='ofitsiant', password='pass12345!')
+        self.admin = User.objects.create_user('admin', role='admin', password='pass12345!')
+
+    def add_rows(self, number):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._add_rows(number)
+
+    def _add_rows(self, number):
+        for i in range(number):
+            food = Food.objects.create(name=f'food {i}', price=1000)
+            for _ in range(2):
+                food.image.add(Image.objects.create())
+            Order.objects.create(user=self.user, food=food)
+            Order.objects.create(user=self.user, food=food, assigned_officiant=self.ofitsiant)
+            Delivered.objects.create(responsible=self.ofitsiant, food=food, sold_number=1, total_income=1000)
+
+    def count_queries(self, user, url):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        user_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, user, url):
+        self.add_rows(1)
+        few = self.count_queries(user, url)
+        self.add_rows(5)
+        many = self.count_queries(user, url)
+        self.assertEqual(few, many, f'{url} runs more queries as rows grow')
+
+    def test_food_list(self):
+        self.assertConstantQueries(self.user, '/user/foods/get/')
+
+    def test_food_list_near(self):
+        self.assertConstantQueries(self.user, '/user/foods/get/?near=40.84,72.32&radius_km=5')
+
+    def test_user_orders(self):
+        self.assertConstantQueries(self.user, '/user/orders/get/')
+
+    def test_ofitsiant_orders(self):
+        self.assertConstantQueries(self.ofitsiant, '/ofitsiant/orders/get/')
+
+    def test_ofitsiant_assigned_orders(self):
+        self.assertConstantQueries(self.ofitsiant, '/ofitsiant/orders-assigned/get/')
+
+    def test_ofitsiant_delivered(self):
+        today = timezone.localdate()
+        self.assertConstantQueries(self.ofitsiant, f'/ofitsiant/delivereds/{today.month}/{today.year}/')
+
+    def test_admin_delivered(self):
+        self.assertConstantQueries(self.admin, '/admin/deliver/')
+
+    def test_async_food_list(self):
+        self.assertConstantQueries(self.user, '/async/user/foods/get/?page_size=10')
+
+    def test_async_user_orders(self):
+        self.assertConstantQueries(self.user, '/async/user/orders/get/')
+
+    def test_async_ofitsiant_orders(self):
+        self.assertConstantQueries(self.ofitsiant, '/async/ofitsiant/orders/get/')
+
+    def test_async_ofitsiant_assigned_orders(self):
+        self.assertConstantQueries(self.ofitsiant, '/async/ofitsiant/orders-assigned/get/')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'query plans are checked on SQLite')
+class HotQueryIndexTests(TestCase):
+    """
+    Queries behind the order queues and delivery reports must be answered from an index.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('user', password='pass12345!')
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        self.assertRegex(plan, r'USING (COVERING )?INDEX', plan)
+
+    def test_unassigned_orders(self):
+        self.assertUsesIndex(Order.objects.filter(assigned_officiant__isnull=True, delivered=False))
+
+    def test_assigned_orders(self):
+        self.assertUsesIndex(Order.objects.filter(assigned_officiant=self.user, delivered=False))
+
+    def test_kitchen_queue(self):
+        self.assertUsesIndex(Order.objects.filter(delivered=False, food_on_the_way=False).order_by('date', 'id'))
+
+    def test_user_orders(self):
+        self.assertUsesIndex(Order.objects.filter(user=self.user).order_by('-date', '-id'))
+
+    def test_ofitsiant_month(self):
+        start, end = get_date_range(2024, 2)
+        self.assertUsesIndex(Delivered.objects.filter(responsible=self.user, date__gte=start, date__lt=end))
+
+    def test_admin_month(self):
+        start, end = get_date_range(2024, 12)
+        self.assertUsesIndex(Delivered.objects.filter(date__gte=start, date__lt=end))
+
+
+@override_settings(METRICS_SAMPLE_RATE=1, METRICS_SERVER_TIMING=True)
+class MetricsTests(TestCase):
+    """
+    The metrics middleware counts the queries a request really runs and reports them per route.
+    """
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', password='pass12345!', role='admin')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+        metrics_registry.clear()
+        user_cache.clear()
+
+    def test_server_timing_and_prometheus(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/user/orders/get/')
+        count = len(queries)
+        self.assertIn(f'desc="{count} queries"', response['Server-Timing'])
+
+        text = self.client.get('/metrics/').content.decode()
+        labels = 'method="GET",route="user/orders/get/",status="200"'
+        self.assertIn(f'fastfood_http_request_duration_seconds_count{{{labels}}} 1', text)
+        self.assertIn(f'fastfood_db_queries_sum{{{labels}}} {count}', text)
+
+
+@override_settings(BENCHMARK_BUDGETS={})
+class OrderLifecycleBenchmarkTests(TransactionTestCase):
+    """
+    Seeded data carries orders through every lifecycle step of the benchmark, up to the sales report.
+    """
+    def test_seed_and_lifecycle(self):
+        call_command('seed_data', users=3, ofitsiants=2, foods=2, images=2, orders=5, stdout=StringIO())
+        self.assertEqual(Order.objects.count(), 5)
+        out = StringIO()
+        call_command('benchmark_orders', cycles=3, concurrency=1, stdout=out)
+        self.assertIn('3 lifecycles within budget', out.getvalue())
+        self.assertEqual(Order.objects.count(), 5)
+        self.assertEqual(Delivered.objects.count(), 3)
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(SalesRollup.objects.filter(period='month').aggregate(total=Sum('sold_number'))['total'],
+                         Delivered.objects.aggregate(total=Sum('sold_number'))['total'])
+
+
+class FoodImportTests(TestCase):
+    """
+    A bad line of an upload is reported on its own while the rest of the file is imported.
+    """
+    def setUp(self):
+        self.ofitsiant = User.objects.create_user('ofitsiant', password='pass12345!', role='ofitsiant')
+        self.client = APIClient()
+        self.client.force_authenticate(self.ofitsiant)
+        cache.clear()
+
+    def test_mixed_ndjson_upload(self):
+        self.assertEqual(self.client.get('/user/foods/get/').json(), [])
+        lines = [b'{"code": "a", "name": "Osh", "price": 25000}', b'{bad', b'{"code": "b", "name": "Lagmon", "price": 30000}']
+        upload = SimpleUploadedFile('menu.ndjson', b'\n'.join(lines))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/ofitsiant/foods/import/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['imported'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2])
+        self.assertEqual({food['name'] for food in self.client.get('/user/foods/get/').json()}, {'Osh', 'Lagmon'})
+
+    def post_file(self, name, content):
+        upload = SimpleUploadedFile(name, content)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/ofitsiant/foods/import/', {'file': upload}, format='multipart')
+
+    def test_json_array_upload_is_parsed_item_by_item(self):
+        content = b'[{"code": "a", "name": "Osh", "price": 25000},\n {"code": "b", "name": "Lagmon", "price": 30000}, {bad}]'
+        with mock.patch('fastfood_app.imports.JSON_CHUNK_SIZE', 8):
+            response = self.post_file('menu.json', content)
+        self.assertEqual(response.data['imported'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [3])
+        self.assertEqual(dict(Food.objects.values_list('code', 'price')), {'a': 25000, 'b': 30000})
+
+        self.assertEqual(self.post_file('menu.json', b'{"code": "a"}').status_code, 400)
+
+    def test_duplicate_code_is_reported(self):
+        lines = [b'{"code": "a", "name": "Osh", "price": 25000}', b'{"code": "a", "name": "Lagmon", "price": 30000}']
+        response = self.post_file('menu.ndjson', b'\n'.join(lines))
+        self.assertEqual(response.data['imported'], 1)
+        self.assertEqual(response.data['errors'], [{'row': 2, 'errors': {'code': ['Duplicate of row 1']}}])
+        self.assertEqual(Food.objects.get(code='a').name, 'Osh')
+
+
+@override_settings(JOB_MAX_ATTEMPTS=2, JOB_RETRY_DELAY=10, JOB_TIMEOUT=300)
+class JobQueueTests(TransactionTestCase):
+    """
+    Jobs are deduplicated by key while pending, claimed once, retried with backoff and never finished twice.
+    run_job closes connections, which a TestCase transaction would not survive.
+    """
+    def setUp(self):
+        self.calls = []
+        TASKS['test_record'] = lambda **payload: self.calls.append(payload)
+        TASKS['test_fail'] = lambda: 1 / 0
+
+    def tearDown(self):
+        TASKS.pop('test_record')
+        TASKS.pop('test_fail')
+
+    def test_enqueue_dedupes_pending_key(self):
+        enqueue('test_record', {'n': 1}, key='k')
+        enqueue('test_record', {'n': 2}, key='k')
+        self.assertEqual(Job.objects.count(), 1)
+        claim_jobs(10)
+        enqueue('test_record', {'n': 3}, key='k')
+        self.assertEqual(Job.objects.filter(status='pending').count(), 1)
+
+    def test_claims_due_jobs_once(self):
+        enqueue('test_record', {'n': 1})
+        enqueue('test_record', {'n': 2}, delay=60)
+        ids = claim_jobs(10)
+        self.assertEqual(len(ids), 1)
+        self.assertEqual(claim_jobs(10), [])
+        self.assertTrue(run_job(ids[0]))
+        self.assertEqual(self.calls, [{'n': 1}])
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_failed_job_backs_off_then_fails(self):
+        enqueue('test_fail')
+        job_id, = claim_jobs(10)
+        with self.assertLogs('fastfood_app.jobs', 'ERROR'):
+            self.assertFalse(run_job(job_id))
+        job = Job.objects.get(id=job_id)
+        self.assertEqual((job.status, job.attempts), ('pending', 1))
+        self.assertAlmostEqual((job.run_at - timezone.now()).total_seconds(), 10, delta=2)
+
+        Job.objects.filter(id=job_id).update(run_at=timezone.now())
+        claim_jobs(10)
+        with self.assertLogs('fastfood_app.jobs', 'ERROR'):
+            self.assertFalse(run_job(job_id))
+        job = Job.objects.get(id=job_id)
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIn('ZeroDivisionError', job.last_error)
+
+    def test_stale_job_is_requeued(self):
+        enqueue('test_record')
+        job_id, = claim_jobs(10)
+        Job.objects.filter(id=job_id).update(locked_at=timezone.now() - timedelta(seconds=301))
+        requeue_stale_jobs()
+        self.assertEqual(Job.objects.get(id=job_id).status, 'pending')
+        self.assertFalse(run_job(job_id))
+        self.assertEqual(self.calls, [])
+
+    def test_lost_claim_rolls_back_work(self):
+        def requeued_meanwhile(**payload):
+            User.objects.create_user('side-effect', password='pass12345!')
+            Job.objects.filter(name='test_lost').update(locked_at=timezone.now() + timedelta(seconds=1))
+        TASKS['test_lost'] = requeued_meanwhile
+        try:
+            enqueue('test_lost')
+            job_id, = claim_jobs(10)
+            with self.assertLogs('fastfood_app.jobs', 'WARNING'):
+                self.assertFalse(run_job(job_id))
+        finally:
+            TASKS.pop('test_lost')
+        self.assertFalse(User.objects.filter(username='side-effect').exists())
+        self.assertTrue(Job.objects.filter(id=job_id).exists())
+
+
+class KitchenSchedulerTests(TestCase):
+    """
+    Orders take the earliest free kitchen capacity, shared by every scheduler through the database.
+    """
+    def setUp(self):
+        self.scheduler = KitchenScheduler(slot_minutes=5, dishes_per_slot=4)
+        self.now = timezone.now()
+        self.slot = self.scheduler.slot_of(self.now)
+
+    def dishes(self):
+        return dict(KitchenSlot.objects.filter(dishes__gt=0).values_list('slot', 'dishes'))
+
+    def test_reserve_fills_earliest_capacity(self):
+        self.assertEqual(self.scheduler.reserve(3, self.now), [[self.slot, 3]])
+        booking = self.scheduler.reserve(6, self.now)
+        self.assertEqual(booking, [[self.slot, 1], [self.slot + 1, 4], [self.slot + 2, 1]])
+        self.assertEqual(self.scheduler.ready_time(booking), self.scheduler.slot_end(self.slot + 2))
+
+    def test_schedulers_share_capacity(self):
+        other = KitchenScheduler(slot_minutes=5, dishes_per_slot=4) # another worker process
+        self.scheduler.reserve(4, self.now)
+        self.assertEqual(other.reserve(1, self.now), [[self.slot + 1, 1]])
+
+    def test_next_open_slot_skips_backlog_in_one_query(self):
+        KitchenSlot.objects.bulk_create([KitchenSlot(slot=self.slot + i, dishes=4) for i in range(300)] +
+                                        [KitchenSlot(slot=self.slot + 301, dishes=4), KitchenSlot(slot=self.slot + 303, dishes=1)])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.scheduler.next_open_slot(self.slot), self.slot + 300)
+            self.assertEqual(self.scheduler.next_open_slot(self.slot + 301), self.slot + 302)
+            self.assertEqual(self.scheduler.next_open_slot(self.slot + 303), self.slot + 303)
+            self.assertEqual(self.scheduler.next_open_slot(self.slot - 1), self.slot - 1)
+        self.assertEqual(len(queries), 4)
+
+    def test_reserve_books_in_bulk(self):
+        KitchenSlot.objects.bulk_create([KitchenSlot(slot=self.slot + i, dishes=4) for i in range(300)] +
+                                        [KitchenSlot(slot=self.slot + 301, dishes=3)])
+
+        def reserve_queries(count):
+            with CaptureQueriesContext(connection) as queries:
+                booking = self.scheduler.reserve(count, self.now)
+            self.assertEqual(sum(dishes for _, dishes in booking), count)
+            return len(queries), booking
+
+        few, booking = reserve_queries(2)
+        self.assertEqual(booking, [[self.slot + 300, 2]])
+        many, booking = reserve_queries(100)
+        self.assertEqual(booking[:3], [[self.slot + 300, 2], [self.slot + 301, 1], [self.slot + 302, 4]])
+        self.assertLessEqual(many, few + 1) # an UPDATE of booked rows next to the INSERT of new ones
+        self.assertEqual(sum(self.dishes().values()), 300 * 4 + 3 + 102)
+
+    def test_cancel_frees_capacity(self):
+        booking = self.scheduler.reserve(5, self.now)
+        self.scheduler.reserve(2, self.now)
+        self.scheduler.cancel(booking)
+        self.assertEqual(self.dishes(), {self.slot + 1: 2})
+        self.assertEqual(self.scheduler.reserve(4, self.now), [[self.slot, 4]])
+
+    def test_release_frees_order_slots(self):
+        user = User.objects.create_user('user', password='pass12345!')
+        food = Food.objects.create(name='Osh', price=25000)
+        order = Order.objects.create(user=user, food=food, count=2, kitchen_slots=self.scheduler.reserve(2, self.now))
+        self.scheduler.release(order)
+        self.assertEqual(order.kitchen_slots, [])
+        self.assertEqual(self.dishes(), {})
+
+        order = Order.objects.create(user=user, food=food, count=3, kitchen_slots=self.scheduler.reserve(3, self.now))
+        order.delete()
+        self.assertEqual(self.dishes(), {})
+
+    def test_compaction_after_cancel_never_overbooks(self):
+        user = User.objects.create_user('user', password='pass12345!')
+        food = Food.objects.create(name='Osh', price=25000)
+        orders = [Order.objects.create(user=user, food=food, count=count, kitchen_slots=self.scheduler.reserve(count))
+                  for count in (4, 4, 2)]
+        orders[0].delete() # cancelled, its slot goes to the next new order
+        Order.objects.create(user=user, food=food, count=2, kitchen_slots=self.scheduler.reserve(2))
+        recompute_estimates()
+
+        pending = Order.objects.all()
+        self.assertLessEqual(max(self.dishes().values()), 4)
+        self.assertEqual(sum(self.dishes().values()), sum(order.count for order in pending))
+        for order in pending:
+            self.assertEqual(sum(dishes for _, dishes in order.kitchen_slots), order.count)
+
+    def test_compaction_runs_constant_queries(self):
+        user = User.objects.create_user('user', password='pass12345!')
+        food = Food.objects.create(name='Osh', price=25000)
+
+        def recompute_queries(orders):
+            Order.objects.bulk_create([Order(user=user, food=food, count=3) for _ in range(orders)])
+            with CaptureQueriesContext(connection) as queries:
+                recompute_estimates()
+            return len(queries)
+
+        self.assertEqual(recompute_queries(2), recompute_queries(20))
+
+    def test_compaction_keeps_cooked_orders(self):
+        user = User.objects.create_user('user', password='pass12345!')
+        food = Food.objects.create(name='Osh', price=25000)
+        hour_ago = self.now - timedelta(hours=1)
+        booking = [[self.scheduler.slot_of(hour_ago), 4]]
+        cooked = Order.objects.create(user=user, food=food, count=4, kitchen_slots=booking,
+                                      ready_at=self.scheduler.ready_time(booking), estimate_date=7)
+        waiting = Order.objects.create(user=user, food=food, count=2, kitchen_slots=self.scheduler.reserve(2))
+        recompute_estimates()
+
+        cooked.refresh_from_db()
+        waiting.refresh_from_db()
+        self.assertEqual((cooked.kitchen_slots, cooked.ready_at, cooked.estimate_date),
+                         (booking, self.scheduler.ready_time(booking), 7))
+        self.assertEqual(sum(dishes for _, dishes in waiting.kitchen_slots), 2)
+        self.assertEqual(sum(self.dishes().values()), 2)
+
+
+class MenuCacheTests(TestCase):
+    """
+    The cached menu answers 304 to a known ETag until foods or ratings change in any process.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('user', password='pass12345!')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food = Food.objects.create(name='Osh', price=25000)
+
+    def get_menu(self, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get('/user/foods/get/', headers=headers)
+
+    def test_known_etag_is_not_modified(self):
+        response = self.get_menu()
+        self.assertEqual(response.status_code, 200)
+        response = self.get_menu(response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_food_change_invalidates_menu(self):
+        etag = self.get_menu()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food.name = 'Lagmon'
+            self.food.save()
+        response = self.get_menu(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['name'], 'Lagmon')
+
+    def test_rate_change_invalidates_menu(self):
+        etag = self.get_menu()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            rate_food(self.food.id, self.user, 4)
+        response = self.get_menu(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['overal_rating'], 4)
+
+    def test_bump_from_another_process_invalidates_menu(self):
+        etag = self.get_menu()['ETag']
+        MenuVersion.objects.filter(id=MENU_VERSION_ID).update(version=F('version') + 1) # local cache untouched
+        self.assertEqual(self.get_menu(etag).status_code, 200)
+
+
+
+class AsyncAPIViewTests(TestCase):
+    """
+    Async views answer API errors of their handlers like DRF does, not with a 500.
+    """
+    def test_bad_cursor_is_not_found(self):
+        user = User.objects.create_user('user', password='pass12345!')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        response = client.get('/async/user/foods/get/?page_size=10&cursor=zzz')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', response.json())
+
+
+class FoodPriceFilterTests(TestCase):
+    """
+    Price filters take finite numbers only, on the sync and async food lists.
+    """
+    def test_non_finite_price_is_bad_request(self):
+        user = User.objects.create_user('user', password='pass12345!')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        for url in ['/user/foods/get/', '/async/user/foods/get/']:
+            for query in ['min_price=inf', 'max_price=nan', 'min_price=-Infinity']:
+                self.assertEqual(client.get(f'{url}?{query}').status_code, 400, f'{url}?{query}')
+
+
+class CreateOrderTests(TestCase):
+    """
+    A new order books kitchen capacity for a positive number of dishes only.
+    """
+    def setUp(self):
+        user = User.objects.create_user('user', password='pass12345!')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        self.food = Food.objects.create(name='Osh', price=25000)
+
+    def post_order(self, count):
+        return self.client.post('/user/orders/post/', {
+            'food': self.food.id, 'count': count, 'address_lat_a': 40.84, 'address_long_a': 72.33,
+        }, format='json')
+
+    def test_count_must_be_positive(self):
+        for count in (0, -3):
+            response = self.post_order(count)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('count', response.json())
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(KitchenSlot.objects.filter(dishes__gt=0).exists())
+
+    def test_order_books_its_dishes(self):
+        self.assertEqual(self.post_order(3).status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual(sum(dishes for _, dishes in order.kitchen_slots), 3)
+
+
+class RatingTests(TestCase):
+    """
+    Food rating totals follow every rate, and recompute_ratings rebuilds the same totals from Rate rows.
+    """
+    def setUp(self):
+        self.food = Food.objects.create(name='Osh', price=25000)
+        self.users = [User.objects.create_user(f'user{i}', password='pass12345!') for i in range(2)]
+
+    def assertTotals(self, rating_sum, rated_users, rating):
+        self.food.refresh_from_db()
+        self.assertEqual(self.food.rating_sum, rating_sum)
+        self.assertEqual(self.food.overal_rated_users, rated_users)
+        self.assertAlmostEqual(self.food.overal_rating, rating)
+
+    def test_rates_move_totals(self):
+        rate_food(self.food.id, self.users[0], 5)
+        self.assertTotals(5, 1, 5)
+        rate_food(self.food.id, self.users[1], 2)
+        self.assertTotals(7, 2, 3.5)
+        rate_food(self.food.id, self.users[0], 3) # changed rate, not a new user
+        self.assertTotals(5, 2, 2.5)
+        self.assertEqual(Rate.objects.count(), 2)
+
+    def test_recompute_ratings_rebuilds_totals(self):
+        rate_food(self.food.id, self.users[0], 4)
+        rate_food(self.food.id, self.users[1], 1)
+        Food.objects.filter(id=self.food.id).update(rating_sum=0, overal_rated_users=0, overal_rating=0)
+        self.assertEqual(recompute_ratings(), 1)
+        self.assertTotals(5, 2, 2.5)
+
+        Rate.objects.all().delete()
+        recompute_ratings()
+        self.assertTotals(0, 0, 0)
+
+    def test_each_rate_bumps_menu_version_once(self):
+        for rate in (5, 3): # a first rate, then a changed one
+            before = MenuVersion.objects.get_or_create(id=MENU_VERSION_ID)[0].version
+            with self.captureOnCommitCallbacks(execute=True):
+                rate_food(self.food.id, self.users[0], rate)
+            self.assertEqual(MenuVersion.objects.get(id=MENU_VERSION_ID).version, before + 1)
+
+
+class DeliverOrdersTests(TestCase):
+    """
+    Delivering turns the ofitsiant's own orders into Delivered rows priced in so'm, all in one transaction.
+    """
+    def setUp(self):
+        ExchangeRate.objects.create(valyuta='usd', rate=12000)
+        ExchangeRate.objects.create(valyuta='rubl', rate=130)
+        clear_exchange_rates()
+        self.addCleanup(clear_exchange_rates)
+        user = User.objects.create_user('user', password='pass12345!')
+        self.ofitsiant = User.objects.create_user('ofitsiant', role='ofitsiant', password='pass12345!')
+        other = User.objects.create_user('other', role='ofitsiant', password='pass12345!')
+        foods = [Food.objects.create(name='Burger', price=3, valyuta='usd'),
+                 Food.objects.create(name='Pelmeni', price=250, valyuta='rubl'),
+                 Food.objects.create(name='Osh', price=25000)]
+        self.orders = [Order.objects.create(user=user, food=food, count=2, assigned_officiant=self.ofitsiant)
+                       for food in foods]
+        self.other_order = Order.objects.create(user=user, food=foods[2], count=1, assigned_officiant=other)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.ofitsiant)}')
+
+    def test_deliver_many_prices_in_som(self):
+        ids = [order.id for order in self.orders]
+        response = self.client.put('/ofitsiant/orders/delivered/put/', {'ids': [*ids, self.other_order.id, 999999]},
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'delivered': sorted(ids),
+            'not_found': [self.other_order.id, 999999],
+            'total_income': 2 * 3 * 12000 + 2 * 250 * 130 + 2 * 25000,
+        })
+        self.assertEqual(sorted(Delivered.objects.values_list('food__name', 'sold_number', 'total_income')),
+                         [('Burger', 2, 72000), ('Osh', 2, 50000), ('Pelmeni', 2, 65000)])
+        self.assertEqual(list(Order.objects.values_list('id', flat=True)), [self.other_order.id])
+        job = Job.objects.get(name='record_sales')
+        self.assertEqual(sorted(job.payload['ids']), sorted(Delivered.objects.values_list('id', flat=True)))
+
+    def test_other_ofitsiants_order_is_refused(self):
+        response = self.client.put(f'/ofitsiant/order/delivered/put/{self.other_order.id}/')
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(Order.objects.filter(id=self.other_order.id).exists())
+        self.assertFalse(Delivered.objects.exists())
+
+    def test_deliver_one(self):
+        response = self.client.put(f'/ofitsiant/order/delivered/put/{self.orders[0].id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Order.objects.filter(id=self.orders[0].id).exists())
+        self.assertEqual(Delivered.objects.get().total_income, 72000)
+
+    def test_failure_keeps_orders(self):
+        with mock.patch('fastfood_app.delivery.enqueue', side_effect=RuntimeError('queue down')):
+            with self.assertRaises(RuntimeError):
+                deliver_orders(self.ofitsiant, [order.id for order in self.orders])
+        self.assertEqual(Order.objects.count(), 4)
+        self.assertFalse(Delivered.objects.exists())
+
+
+class SalesReportTests(TestCase):
+    """
+    Deliveries add up in daily and monthly rollups of the local calendar; a rebuild gives the same totals.
+    """
+    def setUp(self):
+        self.ofitsiants = [User.objects.create_user(f'ofitsiant{i}', role='ofitsiant', password='pass12345!')
+                           for i in range(2)]
+        self.osh = Food.objects.create(name='Osh', price=25000)
+        self.somsa = Food.objects.create(name='Somsa', price=8000)
+        # Asia/Tashkent is UTC+5, so the first delivery falls on February 1 there
+        self.delivered = [
+            self.deliver(self.ofitsiants[0], self.osh, 2, datetime(2024, 1, 31, 20, tzinfo=dt_timezone.utc)),
+            self.deliver(self.ofitsiants[0], self.osh, 1, datetime(2024, 2, 10, 9, tzinfo=dt_timezone.utc)),
+            self.deliver(self.ofitsiants[0], self.somsa, 5, datetime(2024, 2, 10, 12, tzinfo=dt_timezone.utc)),
+            self.deliver(self.ofitsiants[1], self.osh, 3, datetime(2024, 1, 31, 18, tzinfo=dt_timezone.utc)),
+        ]
+        record_sales(Delivered.objects.all())
+
+    def deliver(self, responsible, food, sold_number, moment):
+        delivered = Delivered.objects.create(responsible=responsible, food=food, sold_number=sold_number,
+                                             total_income=sold_number * food.price)
+        Delivered.objects.filter(id=delivered.id).update(date=moment)
+        return delivered
+
+    def rollups(self, period):
+        return set(SalesRollup.objects.filter(period=period).values_list(
+            'period_start', 'responsible__username', 'food__name', 'sold_number', 'total_income'))
+
+    def test_local_day_and_month_buckets(self):
+        self.assertEqual(self.rollups('day'), {
+            (date(2024, 2, 1), 'ofitsiant0', 'Osh', 2, 50000),
+            (date(2024, 2, 10), 'ofitsiant0', 'Osh', 1, 25000),
+            (date(2024, 2, 10), 'ofitsiant0', 'Somsa', 5, 40000),
+            (date(2024, 1, 31), 'ofitsiant1', 'Osh', 3, 75000),
+        })
+        self.assertEqual(self.rollups('month'), {
+            (date(2024, 2, 1), 'ofitsiant0', 'Osh', 3, 75000),
+            (date(2024, 2, 1), 'ofitsiant0', 'Somsa', 5, 40000),
+            (date(2024, 1, 1), 'ofitsiant1', 'Osh', 3, 75000),
+        })
+
+    def test_rebuild_matches_incremental_totals(self):
+        incremental = {period: self.rollups(period) for period in ('day', 'month')}
+        record_sales(Delivered.objects.filter(id=self.delivered[0].id)) # a delivery counted twice, fixed by the rebuild
+        self.assertEqual(rebuild_sales_rollups(), 7)
+        self.assertEqual({period: self.rollups(period) for period in ('day', 'month')}, incremental)
+
+    def test_ofitsiant_summary_reads_own_sales(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.ofitsiants[0])}')
+        report = client.get('/ofitsiant/delivereds/2/2024/summary/').json()
+        self.assertEqual((report['sold_number'], report['total_income']), (8, 115000))
+        self.assertEqual([(food['name'], food['sold_number']) for food in report['foods']], [('Osh', 3), ('Somsa', 5)])
+        self.assertEqual(client.get('/ofitsiant/delivereds/1/2024/summary/').json()['foods'], [])
+
+    def test_admin_summary_filters_by_responsible(self):
+        admin = User.objects.create_user('admin', role='admin', password='pass12345!')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(admin)}')
+        report = client.get('/admin/deliver/summary/', {'year': 2024, 'month': 1}).json()
+        self.assertEqual((report['sold_number'], report['total_income']), (3, 75000))
+        report = client.get('/admin/deliver/summary/', {'year': 2024, 'month': 2, 'responsible': self.ofitsiants[1].id}).json()
+        self.assertEqual(report['sold_number'], 0)
+        report = client.get('/admin/deliver/summary/', {'year': 2024, 'month': 2, 'responsible': self.ofitsiants[0].id}).json()
+        self.assertEqual(report['total_income'], 115000)
+        self.assertEqual(client.get('/admin/deliver/summary/', {'year': 2024}).status_code, 400)
+
+
+class ClaimOrdersTests(TransactionTestCase):
+    """
+    An order is accepted by one ofitsiant only, and claims hand out the oldest unassigned orders.
+    Claims race on separate connections, which a TestCase transaction would hide.
+    """
+    def setUp(self):
+        user = User.objects.create_user('user', password='pass12345!')
+        self.ofitsiants = [User.objects.create_user(f'ofitsiant{i}', role='ofitsiant', password='pass12345!')
+                           for i in range(2)]
+        food = Food.objects.create(name='Osh', price=25000)
+        start = timezone.now() - timedelta(hours=1)
+        self.orders = []
+        for minutes in range(30):
+            order = Order.objects.create(user=user, food=food)
+            Order.objects.filter(id=order.id).update(date=start + timedelta(minutes=minutes))
+            self.orders.append(order.id)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        return client
+
+    def claim(self, user, count):
+        try:
+            response = self.client_for(user).put(f'/ofitsiant/orders/claim/put/{count}/')
+            self.assertEqual(response.status_code, 200)
+            return [order['id'] for order in response.json()]
+        finally:
+            connection.close()
+
+    def check_claims(self, claims):
+        claimed = [order_id for ids in claims for order_id in ids]
+        self.assertEqual(len(claimed), len(set(claimed)))
+        self.assertEqual(sorted(claimed), self.orders[:len(claimed)])
+        for user, ids in zip(self.ofitsiants * 2, claims):
+            self.assertEqual(Order.objects.filter(id__in=ids).exclude(assigned_officiant=user).count(), 0)
+
+    def test_second_accept_is_not_found(self):
+        url = f'/ofitsiant/order/accept/put/{self.orders[0]}/'
+        self.assertEqual(self.client_for(self.ofitsiants[0]).put(url).status_code, 200)
+        self.assertEqual(self.client_for(self.ofitsiants[1]).put(url).status_code, 404)
+        self.assertEqual(Order.objects.get(id=self.orders[0]).assigned_officiant, self.ofitsiants[0])
+
+    def test_claim_takes_oldest_up_to_max_count(self):
+        Order.objects.filter(id=self.orders[0]).update(assigned_officiant=self.ofitsiants[1])
+        self.assertEqual(self.claim(self.ofitsiants[0], 3), self.orders[1:4])
+        self.assertEqual(self.claim(self.ofitsiants[0], 100), self.orders[4:24]) # max_count is 20
+        self.assertEqual(Order.objects.filter(assigned_officiant=self.ofitsiants[0]).count(), 23)
+
+    def test_claims_never_share_orders(self):
+        self.check_claims([self.claim(user, 10) for user in self.ofitsiants * 2])
+
+    @skipUnless(connection.features.has_select_for_update_skip_locked,
+                'claims on SQLite take turns; its shared-cache test database fails them instead of waiting')
+    def test_concurrent_claims_never_share_orders(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            self.check_claims(list(executor.map(lambda user: self.claim(user, 10), self.ofitsiants * 2)))
+
+
+class CartTests(TestCase):
+    """
+    A cart books every line in the kitchen and gives all its orders one estimate.
+    """
+    def setUp(self):
+        user = User.objects.create_user('user', password='pass12345!')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        self.foods = [Food.objects.create(name='Osh', price=25000),
+                      Food.objects.create(name='Somsa', price=8000, address_lat_a=40.9, address_long_a=72.4)]
+
+    def post_cart(self, lines):
+        return self.client.post('/user/orders/cart/post/', {
+            'lines': lines, 'address_lat_a': 40.84, 'address_long_a': 72.33,
+        }, format='json')
+
+    def test_lines_share_one_estimate(self):
+        response = self.post_cart([{'food': self.foods[0].id, 'count': 3}, {'food': self.foods[1].id, 'count': 4},
+                                   {'food': self.foods[0].id, 'count': 2}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['orders']), 3)
+        orders = Order.objects.all()
+        self.assertEqual({(order.estimate_date, order.ready_at) for order in orders},
+                         {(response.json()['estimate_date'], max(order.ready_at for order in orders))})
+        self.assertEqual(sum(dishes for order in orders for _, dishes in order.kitchen_slots), 9)
+        self.assertEqual(sum(KitchenSlot.objects.filter(slot__gte=0).values_list('dishes', flat=True)), 9)
+
+    def test_unknown_food_books_nothing(self):
+        response = self.post_cart([{'food': self.foods[0].id, 'count': 3}, {'food': 999999, 'count': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('999999', response.json()['lines'][0])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(KitchenSlot.objects.filter(dishes__gt=0).exists())
+
+
+class PasswordHashTests(TestCase):
+    """
+    Passwords are hashed once with the first of PASSWORD_HASHERS, and older hashes move to it on login.
+    """
+    password = 'Kech-qolgan-osh-42'
+
+    def count_hashes(self):
+        return mock.patch.object(User, 'set_password', autospec=True, side_effect=User.set_password)
+
+    def test_registration_hashes_once(self):
+        with self.count_hashes() as set_password:
+            response = self.client.post('/account/register/', {'username': 'newuser', 'password': self.password},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(set_password.call_count, 1)
+        user = User.objects.get(username='newuser')
+        self.assertIn(identify_hasher(user.password).algorithm, ('argon2', 'scrypt'))
+        self.assertTrue(user.check_password(self.password))
+
+    def test_hash_is_never_hashed_again(self):
+        user = User.objects.create_user('user', password=self.password)
+        hashed = user.password
+        user.first_name = 'Aziz'
+        user.save()
+        self.assertEqual(User.objects.get(id=user.id).password, hashed)
+        self.assertFalse(is_password_hash(self.password))
+        self.assertTrue(is_password_hash(hashed))
+
+    def test_pbkdf2_account_is_rehashed_on_login(self):
+        user = User.objects.create_user('user')
+        User.objects.filter(id=user.id).update(password=make_password(self.password, hasher='pbkdf2_sha256'))
+        with self.count_hashes() as set_password:
+            response = self.client.post('/account/login/', {'username': 'user', 'password': self.password},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set_password.call_count, 1)
+        user.refresh_from_db()
+        self.assertIn(identify_hasher(user.password).algorithm, ('argon2', 'scrypt'))
+        self.assertTrue(user.check_password(self.password))
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    """
+    Cached users skip the User query but are dropped on save or delete, and still go through every token check.
+    """
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.user = User.objects.create_user('user', first_name='Aziz', password='pass12345!')
+
+    def get_info(self, token=None, url='/account/info/'):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token or AccessToken.for_user(self.user)}')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.user_queries = sum('fastfood_app_user' in query['sql'] for query in queries)
+        return response
+
+    def test_cache_hit_skips_user_query(self):
+        self.assertEqual(self.get_info().status_code, 200)
+        self.assertEqual(self.user_queries, 1)
+        self.assertEqual(self.get_info().json()['first_name'], 'Aziz')
+        self.assertEqual(self.user_queries, 0)
+
+    def test_save_and_delete_drop_cached_user(self):
+        token = AccessToken.for_user(self.user)
+        self.get_info(token)
+        self.user.first_name = 'Bobur'
+        self.user.save()
+        self.assertEqual(self.get_info(token).json()['first_name'], 'Bobur')
+        self.assertEqual(self.user_queries, 1)
+        self.user.delete()
+        self.assertEqual(self.get_info(token).status_code, 401)
+
+    def test_inactive_user_is_refused(self):
+        token = AccessToken.for_user(self.user)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_info(token).status_code, 401)
+        user_cache.set(self.user.id, self.user) # an inactive user still cached must be refused too
+        response = self.get_info(token)
+        self.assertEqual((response.status_code, response.json()['code']), (401, 'user_inactive'))
+        self.assertEqual(self.user_queries, 0)
+
+    @override_settings(JWT_ROLE_CLAIM=True)
+    def test_changed_role_is_refused(self):
+        token = RoleRefreshToken.for_user(self.user).access_token
+        self.assertEqual(self.get_info(token).status_code, 200)
+        self.user.role = 'ofitsiant'
+        self.user.save()
+        for url in ['/account/info/', '/account/info/', '/async/user/orders/get/']: # a miss, then cache hits
+            response = self.get_info(token, url)
+            self.assertEqual(response.status_code, 401, url)
+            self.assertIn('role', str(response.json()['detail']))
+        response = self.get_info(token)
+        self.assertEqual(response.json()['code'], 'role_changed')
+
+
+class ExchangeRateTests(TestCase):
+    """
+    New rates reprice foods at once, and every process prices with them from its next conversion.
+    """
+    def setUp(self):
+        clear_exchange_rates()
+        self.addCleanup(clear_exchange_rates)
+        self.burger = Food.objects.create(name='Burger', price=3, valyuta='usd')
+        self.osh = Food.objects.create(name='Osh', price=25000)
+
+    def test_set_exchange_rates_reprices_foods(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            set_exchange_rates({'usd': 12500.5})
+        self.burger.refresh_from_db()
+        self.osh.refresh_from_db()
+        self.assertEqual((self.burger.price_in_som, self.osh.price_in_som), (37501, 25000))
+        self.assertEqual(ExchangeRate.objects.get(valyuta='usd').rate, 12500.5)
+
+    def test_rates_set_by_another_process_are_used(self):
+        get_exchange_rates() # cached in this process
+        # another process: store a rate and move the version on, without touching this process's cache
+        ExchangeRate.objects.create(valyuta='usd', rate=13000)
+        ExchangeRateVersion.objects.update(version=F('version') + 1)
+        self.assertEqual(get_exchange_rates()['usd'], 13000)
+        self.burger.save()
+        self.assertEqual(self.burger.price_in_som, 39000)
+
+
+@override_settings(IMAGE_WIDTHS=(320, 640), IMAGE_THUMBNAIL_SIZE=40)
+class ImageStorageTests(TestCase):
+    """
+    Identical uploads share one row and one set of files, and deleting them never removes files in use again.
+    """
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=media)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def upload(self, color, name='food.png'):
+        buffer = BytesIO()
+        PILImage.new('RGB', (800, 400), color).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def stored(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, file), default_storage.location).replace(os.sep, '/')
+            for root, _, files in os.walk(default_storage.location) for file in files
+        )
+
+    def test_identical_uploads_share_a_row_and_a_file(self):
+        red, blue = save_images([self.upload('red'), self.upload('red', 'copy.PNG'), self.upload('blue')])
+        self.assertNotEqual(red.content_hash, blue.content_hash)
+        self.assertEqual(Image.objects.count(), 2)
+        self.assertEqual(red.image.name, f'food_images/{red.content_hash}.png')
+        self.assertEqual(save_images([self.upload('red')]), [red])
+        self.assertEqual(self.stored(), sorted([red.image.name, blue.image.name]))
+
+    def test_upload_losing_the_insert_stores_no_file(self):
+        content_hash = save_images([self.upload('red')])[0].content_hash
+        # another request inserted the row after this one looked for it
+        with mock.patch('django.db.models.QuerySet.values_list', return_value=[]):
+            image, = save_images([self.upload('red')])
+        self.assertEqual(image.content_hash, content_hash)
+        self.assertEqual(self.stored(), [f'food_images/{content_hash}.png'])
+
+    def test_variants_and_srcset(self):
+        image, = save_images([self.upload('red')])
+        variants = process_image(image.id)
+        base = f'food_images/{image.content_hash[:2]}/{image.content_hash}'
+        self.assertEqual(variants, {
+            'thumbnail': f'{base}/thumb.webp',
+            'webp': {str(width): f'{base}/{width}.webp' for width in (320, 640)},
+            'jpeg': {str(width): f'{base}/{width}.jpeg' for width in (320, 640)},
+        })
+        with default_storage.open(variants['webp']['320']) as file:
+            self.assertEqual(PILImage.open(file).size, (320, 160))
+        with default_storage.open(variants['thumbnail']) as file:
+            self.assertEqual(PILImage.open(file).size, (40, 40))
+
+        image.refresh_from_db()
+        srcset = ImageSerializer(image).data['srcset']
+        self.assertEqual(srcset['jpeg'], f'/media/{base}/320.jpeg 320w, /media/{base}/640.jpeg 640w')
+        self.assertEqual(srcset['webp'], f'/media/{base}/320.webp 320w, /media/{base}/640.webp 640w')
+
+    def delete_food_with(self, color):
+        food = Food.objects.create(name='Osh')
+        image, = save_images([self.upload(color)])
+        food.image.add(image)
+        process_image(image.id)
+        food.delete()
+        job = Job.objects.get(name='delete_files')
+        job.delete()
+        return job.payload
+
+    def test_deleting_a_food_deletes_its_files(self):
+        payload = self.delete_food_with('red')
+        TASKS['delete_files'](**payload)
+        self.assertEqual(self.stored(), [])
+
+    def test_reuploaded_image_keeps_its_files(self):
+        payload = self.delete_food_with('red')
+        image, = save_images([self.upload('red')]) # before the delete job runs
+        process_image(image.id)
+        TASKS['delete_files'](**payload)
+        image.refresh_from_db()
+        self.assertEqual(self.stored(), sorted(image_file_names(image)))
+
+
+class OrderStreamTests(TransactionTestCase):
+    """
+    An order stream holds its broker subscription only while it is iterated.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('user', password='pass12345!')
+        self.food = Food.objects.create(name='Osh', price=25000)
+        self.order = Order.objects.create(user=self.user, food=self.food)
+        self.channels = [user_channel(self.user.id)]
+
+    def test_snapshot_then_close(self):
+        async def first_event():
+            stream = stream_events(self.channels, Order.objects.filter(user=self.user))
+            self.assertNotIn(self.channels[0], get_broker().subscriptions) # nothing before iteration
+            event = await stream.__anext__()
+            self.assertIn(self.channels[0], get_broker().subscriptions)
+            await stream.aclose()
+            return event
+
+        event = async_to_sync(first_event)()
+        self.assertTrue(event.startswith('event: snapshot\n'))
+        self.assertIn(f'"id": {self.order.id}', event)
+        self.assertNotIn(self.channels[0], get_broker().subscriptions)
+
+    def test_failed_snapshot_unsubscribes(self):
+        async def first_event():
+            await stream_events(self.channels, Order.objects.filter(user=self.user)).__anext__()
+
+        with mock.patch('django.db.models.QuerySet.order_by', side_effect=DatabaseError('gone')):
+            with self.assertRaises(DatabaseError):
+                async_to_sync(first_event)()
+        self.assertNotIn(self.channels[0], get_broker().subscriptions)
@@ -7,21 +7,34 @@ from .views import (
     UserDeleteAPIView,
     UserControlView,
     UserOrderCreateAPIView,
+    UserCartCreateAPIView,
     UserOrdersAPIView,
     UserOrderDeleteAPIView,
     FoodListAPIView,
     FoodCreateAPIView,
+    FoodImportAPIView,
     FoodUpdateAPIView,
     FoodDeleteAPIView,
     OfitsiantOrderListAPIView,
     OfitsiantOrderAssignedListAPIView,
     OfitsiantOrderAcceptAPIView,
+    OfitsiantOrderClaimAPIView,
     OfitsiantOrderOnTheWayAPIView,
     OfitsiantOrderDeliverAPIView,
+    OfitsiantOrderDeliverManyAPIView,
     DeliveredModelViewSet,
+    MetricsAPIView,
     OfitsiantDeliveredAPIView,
+    OfitsiantDeliveredSummaryAPIView,
     RateFoodAPIView,
 )
+from .streams import user_order_events, ofitsiant_order_events
+from .async_views import (
+    AsyncFoodListView,
+    AsyncUserOrdersView,
+    AsyncOfitsiantOrderListView,
+    AsyncOfitsiantOrderAssignedListView,
+)
 
 from rest_framework_simplejwt.views import (
     TokenRefreshView,
@@ -43,22 +56,36 @@ urlpatterns = [
     
     # admin
     path('admin/', include(router.urls)),
+    path('metrics/', MetricsAPIView.as_view(), name='metrics'),
 
     # ofissant
     path('ofitsiant/foods/post/', FoodCreateAPIView.as_view(), name='food-create'),
+    path('ofitsiant/foods/import/', FoodImportAPIView.as_view(), name='food-import'),
     path('ofitsiant/foods/get/', FoodListAPIView.as_view(), name='ofisant-food-list'),
     path('ofitsiant/foods/put/<int:id>/', FoodUpdateAPIView.as_view(), name='ofisant-food-edit'),
     path('ofitsiant/foods/delete/<int:id>/', FoodDeleteAPIView.as_view(), name='ofisant-food-delete'),
     path('ofitsiant/orders/get/', OfitsiantOrderListAPIView.as_view(), name='order-get'),
+    path('ofitsiant/orders/events/', ofitsiant_order_events, name='ofitsiant-order-events'),
     path('ofitsiant/orders-assigned/get/', OfitsiantOrderAssignedListAPIView.as_view(), name='order-get-assigned'),
     path('ofitsiant/order/accept/put/<int:id>/', OfitsiantOrderAcceptAPIView.as_view(), name='order-food-accept'),
+    path('ofitsiant/orders/claim/put/<int:count>/', OfitsiantOrderClaimAPIView.as_view(), name='order-food-claim'),
     path('ofitsiant/order/on-way/put/<int:id>/', OfitsiantOrderOnTheWayAPIView.as_view(), name='order-food-on-way'),
     path('ofitsiant/order/delivered/put/<int:id>/', OfitsiantOrderDeliverAPIView.as_view(), name='order-food-delivered'),
+    path('ofitsiant/orders/delivered/put/', OfitsiantOrderDeliverManyAPIView.as_view(), name='orders-food-delivered'),
     path('ofitsiant/delivereds/<int:month>/<int:year>/', OfitsiantDeliveredAPIView.as_view(), name='delivered-get'),
+    path('ofitsiant/delivereds/<int:month>/<int:year>/summary/', OfitsiantDeliveredSummaryAPIView.as_view(), name='delivered-summary'),
     # user
     path('user/foods/get/', FoodListAPIView.as_view(), name='food-list'),
     path('user/foods/rate/<int:id>/<int:rate>/', RateFoodAPIView.as_view(), name='food-rate'),
     path('user/orders/post/', UserOrderCreateAPIView.as_view(), name='order-create'),
+    path('user/orders/cart/post/', UserCartCreateAPIView.as_view(), name='order-cart-create'),
     path('user/orders/get/', UserOrdersAPIView.as_view(), name='order-get'),
+    path('user/orders/events/', user_order_events, name='user-order-events'),
     path('user/orders/delete/<int:id>/', UserOrderDeleteAPIView.as_view(), name='order-delete'),
+
+    # async variants of the hot read endpoints, for ASGI deployments
+    path('async/user/foods/get/', AsyncFoodListView.as_view(), name='async-food-list'),
+    path('async/user/orders/get/', AsyncUserOrdersView.as_view(), name='async-order-get'),
+    path('async/ofitsiant/orders/get/', AsyncOfitsiantOrderListView.as_view(), name='async-ofitsiant-order-get'),
+    path('async/ofitsiant/orders-assigned/get/', AsyncOfitsiantOrderAssignedListView.as_view(), name='async-ofitsiant-order-get-assigned'),
 ]
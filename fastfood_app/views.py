@@ -1,12 +1,16 @@
+import csv
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, AllowAny, BasePermission
-from rest_framework_simplejwt.tokens import RefreshToken
 from drf_spectacular.utils import extend_schema
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 
 from .serializers import (
@@ -16,16 +20,33 @@ from .serializers import (
     EditUserSerializer,
     FoodListSerializer,
     FoodCreateSerializer,
+    FoodImportSerializer,
     FoodEditSerializer,
     OfitsiantOrderSerializer,
     ListUserOrderSerializer,
     CreateUserOrderSerializer,
+    CreateCartSerializer,
+    CartOrderSerializer,
     ListUserOrderSerializer,
     DeliveredSerializer,
+    DeliverOrdersSerializer,
 )
-from .models import User, Food, Order, Delivered, Rate
-from .filters import DeliveredFilter
-from .calculations import change_estimates
+from .models import User, Food, Order, Delivered
+from .filters import DeliveredFilter, get_date_range, filter_foods_by_price, parse_near
+from .menu import get_menu_version, get_menu_etag, get_menu_bytes
+from .pagination import DateCursorPagination, OldestFirstCursorPagination, wants_ndjson, stream_ndjson
+from .calculations import get_foods_near
+from .scheduler import kitchen_scheduler
+from .ratings import rate_food
+from .reports import get_sales_report
+from .delivery import deliver_orders
+from .imports import iter_upload_rows, import_foods
+from .jobs import enqueue
+from .authentication import (
+    CachedJWTAuthentication, MetricsTokenAuthentication, RoleRefreshToken, METRICS_AUTH, get_request_role,
+)
+from .events import publish_orders
+from .metrics import metrics_registry
 
 
 # Admin
@@ -35,7 +56,7 @@ class IsAdminUser(BasePermission):
     """
     def has_permission(self, request, view):
         try:
-            return bool(request.user.role in ['admin'])
+            return bool(get_request_role(request) in ['admin'])
         except: return False
 
 
@@ -43,7 +64,7 @@ class UserControlView(viewsets.ModelViewSet):
     """
     Controls user-related operations accessible only to administrators.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAdminUser]
     serializer_class = UserControlSerializer
     queryset = User.objects.all()
@@ -53,19 +74,49 @@ class DeliveredModelViewSet(viewsets.ModelViewSet):
     """
     Allows administrators to manage Delivered objects, including filtering by year and month.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAdminUser]
-    queryset = Delivered.objects.all()
+    queryset = Delivered.objects.select_related('food').prefetch_related('food__image')
     serializer_class = DeliveredSerializer
     filterset_class = DeliveredFilter
+    pagination_class = DateCursorPagination
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        try:
+            year = int(request.query_params['year'])
+            month = int(request.query_params['month'])
+            responsible = request.query_params.get('responsible')
+            report = get_sales_report(year, month, int(responsible) if responsible else None)
+        except (KeyError, ValueError):
+            return Response({"message": "year and month are required"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+    def list(self, request, *args, **kwargs):
+        if wants_ndjson(request):
+            queryset = self.filter_queryset(self.get_queryset()).order_by('date', 'id')
+            return stream_ndjson(queryset, self.get_serializer_class())
+        return super().list(request, *args, **kwargs)
+
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        year = self.request.query_params.get('year')
-        month = self.request.query_params.get('month')
-        if year and month:
-            queryset = queryset.filter(date__year=year, date__month=month)
-        return queryset
+class HasMetricsToken(BasePermission):
+    """
+    Allow Prometheus scrapers authenticated by MetricsTokenAuthentication.
+    """
+    def has_permission(self, request, view):
+        return request.auth == METRICS_AUTH
+
+
+class MetricsAPIView(APIView):
+    """
+    Per-route latency, response size and SQL metrics of this process in the Prometheus text format.
+    """
+    authentication_classes = [MetricsTokenAuthentication, CachedJWTAuthentication]
+    permission_classes = [HasMetricsToken | IsAdminUser]
+
+    @extend_schema(exclude=True)
+    def get(self, request):
+        return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 # Ofisant
@@ -75,7 +126,7 @@ class IsAdminOrOfitsiantUser(BasePermission):
     """
     def has_permission(self, request, view):
         try:
-            return bool(request.user.role in ['ofitsiant', 'admin'])
+            return bool(get_request_role(request) in ['ofitsiant', 'admin'])
         except: return False
 
 
@@ -83,7 +134,7 @@ class FoodCreateAPIView(APIView):
     """
     Handles the creation of food items through API requests.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAdminOrOfitsiantUser]
     parser_classes = [JSONParser, MultiPartParser, FormParser]
 
@@ -96,11 +147,35 @@ class FoodCreateAPIView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class FoodImportAPIView(APIView):
+    """
+    Handles bulk upsert of food items from a JSON list or an uploaded CSV, NDJSON or JSON file.
+    """
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAdminOrOfitsiantUser]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+
+    @extend_schema(request=FoodImportSerializer(many=True))
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if upload is not None:
+            rows = iter_upload_rows(upload)
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            return Response({"message": "Send a JSON list of foods or a file"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            report = import_foods(rows)
+        except (ValueError, csv.Error) as e:
+            return Response({"message": f"Cannot parse file: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK)
+
+
 class FoodUpdateAPIView(APIView):
     """
     Handles the updating of food items through API requests.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAdminOrOfitsiantUser]
 
     @extend_schema(request=FoodEditSerializer, responses=FoodEditSerializer)
@@ -122,7 +197,7 @@ class FoodDeleteAPIView(APIView):
     """
     Handles the deletion of food items through API requests.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdminOrOfitsiantUser]
     serializer_class = None
 
@@ -140,12 +215,16 @@ class OfitsiantOrderListAPIView(APIView):
     """
     API endpoint for officiants to view unassigned orders.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdminOrOfitsiantUser]
     serializer_class = None
 
     def get(self, request):
-        orders = Order.objects.filter(assigned_officiant__isnull=True, delivered=False)
+        orders = Order.objects.filter(assigned_officiant__isnull=True, delivered=False).select_related('food').prefetch_related('food__image')
+        paginator = OldestFirstCursorPagination()
+        page = paginator.paginate_queryset(orders, request, self)
+        if page is not None:
+            return paginator.get_paginated_response(OfitsiantOrderSerializer(page, many=True).data)
         serializer = OfitsiantOrderSerializer(orders, many=True)
         return Response(serializer.data)
 
@@ -154,12 +233,16 @@ class OfitsiantOrderAssignedListAPIView(APIView):
     """
     API endpoint for officiants to view unassigned orders.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdminOrOfitsiantUser]
     serializer_class = None
     
     def get(self, request):
-        orders = Order.objects.filter(assigned_officiant=request.user, delivered=False)
+        orders = Order.objects.filter(assigned_officiant=request.user, delivered=False).select_related('food').prefetch_related('food__image')
+        paginator = OldestFirstCursorPagination()
+        page = paginator.paginate_queryset(orders, request, self)
+        if page is not None:
+            return paginator.get_paginated_response(OfitsiantOrderSerializer(page, many=True).data)
         serializer = OfitsiantOrderSerializer(orders, many=True)
         return Response(serializer.data)
 
@@ -168,93 +251,155 @@ class OfitsiantOrderAcceptAPIView(APIView):
     """
     API endpoint for officiants to accept orders.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdminOrOfitsiantUser]
     serializer_class = None
     
     def put(self, request, id):
-        try:
-            order = Order.objects.get(id=id, delivered=False, food_on_the_way=False, assigned_officiant__isnull=True)
-            order.assigned_officiant = request.user
-            order.save()
-            return Response({"message": "Order accepted successfully"}, status=status.HTTP_200_OK)
-        except Order.DoesNotExist:
+        claimed = (Order.objects.filter(id=id, delivered=False, food_on_the_way=False, assigned_officiant__isnull=True)
+                   .update(assigned_officiant=request.user))
+        if not claimed:
             return Response({"message": "Order not found or already assigned"}, status=status.HTTP_404_NOT_FOUND)
+        publish_orders(Order.objects.filter(id=id), 'accepted')
+        return Response({"message": "Order accepted successfully"}, status=status.HTTP_200_OK)
+
+
+class OfitsiantOrderClaimAPIView(APIView):
+    """
+    API endpoint for officiants to accept the next oldest unassigned orders.
+    """
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminOrOfitsiantUser]
+    serializer_class = None
+    max_count = 20
+
+    def put(self, request, count):
+        count = min(max(count, 1), self.max_count)
+        with transaction.atomic():
+            pending = (Order.objects.filter(assigned_officiant__isnull=True, delivered=False, food_on_the_way=False)
+                       .order_by('date', 'id'))
+            if connection.features.has_select_for_update_skip_locked:
+                pending = pending.select_for_update(skip_locked=True)
+            ids = list(pending.values_list('id', flat=True)[:count])
+            Order.objects.filter(id__in=ids, assigned_officiant__isnull=True).update(assigned_officiant=request.user)
+
+        orders = (Order.objects.filter(id__in=ids, assigned_officiant=request.user).order_by('date', 'id')
+                  .select_related('food').prefetch_related('food__image'))
+        publish_orders(orders, 'accepted')
+        serializer = OfitsiantOrderSerializer(orders, many=True)
+        return Response(serializer.data)
 
 
 class OfitsiantOrderOnTheWayAPIView(APIView):
     """
     API endpoint for officiants to mark orders as delivered.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdminOrOfitsiantUser]
     serializer_class = None
     
     def put(self, request, id):
-        try:
-            order = Order.objects.get(id=id, assigned_officiant=request.user, delivered=False, food_on_the_way=False)
+        with transaction.atomic():
+            kitchen_scheduler.lock()
+            order = (Order.objects.select_for_update()
+                     .filter(id=id, assigned_officiant=request.user, delivered=False, food_on_the_way=False).first())
+            if order is None:
+                return Response({"message": "Order not found or not assigned to you"}, status=status.HTTP_404_NOT_FOUND)
+            kitchen_scheduler.release(order)
             order.food_on_the_way = True
-            order.save()
-            return Response({"message": "Order is on the way"}, status=status.HTTP_200_OK)
-        except Order.DoesNotExist:
-            return Response({"message": "Order not found or not assigned to you"}, status=status.HTTP_404_NOT_FOUND)
+            order.save(update_fields=['food_on_the_way', 'kitchen_slots'])
+        publish_orders([order], 'on_the_way')
+        return Response({"message": "Order is on the way"}, status=status.HTTP_200_OK)
 
 
 class OfitsiantOrderDeliverAPIView(APIView):
     """
     API endpoint for officiants to mark orders as delivered.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdminOrOfitsiantUser]
     serializer_class = None
     
     def put(self, request, id):
-        try:
-            order = Order.objects.get(id=id, assigned_officiant=request.user, delivered=False)
-            valyuta = order.food.valyuta
-            if valyuta == 'usd':
-                totat_income = int(order.food.price*order.count*12348.14)
-            elif valyuta == 'rubl':
-                totat_income = int(order.food.price*order.count*135.46)
-            else:
-                totat_income = order.food.price*order.count
-            Delivered.objects.create(
-                responsible=request.user,
-                food=order.food,
-                sold_number=order.count,
-                total_income=totat_income
-            )
-
-            order.delete()
-            return Response({"message": "Order delivered successfully"}, status=status.HTTP_200_OK)
-        except Order.DoesNotExist:
+        orders, _ = deliver_orders(request.user, [id])
+        if not orders:
             return Response({"message": "Order not found or not assigned to you"}, status=status.HTTP_404_NOT_FOUND)
+        publish_orders(orders, 'delivered')
+        return Response({"message": "Order delivered successfully"}, status=status.HTTP_200_OK)
+
+
+class OfitsiantOrderDeliverManyAPIView(APIView):
+    """
+    API endpoint for officiants to mark several orders as delivered at once.
+    """
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminOrOfitsiantUser]
+    serializer_class = None
+
+    @extend_schema(request=DeliverOrdersSerializer)
+    def put(self, request):
+        serializer = DeliverOrdersSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        ids = serializer.validated_data['ids']
+        orders, delivered_rows = deliver_orders(request.user, ids)
+        publish_orders(orders, 'delivered')
+        delivered_ids = {order.id for order in orders}
+        return Response({
+            "delivered": sorted(delivered_ids),
+            "not_found": [id for id in ids if id not in delivered_ids],
+            "total_income": sum(row.total_income for row in delivered_rows),
+        }, status=status.HTTP_200_OK)
 
 
 class OfitsiantDeliveredAPIView(APIView):
     """
     Allows ofitsiant to manage Delivered objects, including filtering by year and month.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAdminOrOfitsiantUser]
     serializer_class = DeliveredSerializer
 
     def get(self, request, month, year):
         try:
             user = request.user
-            delivered_objects = Delivered.objects.filter(responsible=user, date__year=year, date__month=month)
+            start, end = get_date_range(year, month)
+            delivered_objects = (Delivered.objects.filter(responsible=user, date__gte=start, date__lt=end)
+                                 .select_related('food').prefetch_related('food__image'))
+            paginator = DateCursorPagination()
+            page = paginator.paginate_queryset(delivered_objects, request, self)
+            if page is not None:
+                return paginator.get_paginated_response(self.serializer_class(page, many=True).data)
             serializer = self.serializer_class(delivered_objects, many=True)
             return Response(serializer.data)
+        except ValueError:
+            return Response({"message": "Invalid month or year"}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({"message": f"Server error: {e}"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
 
+class OfitsiantDeliveredSummaryAPIView(APIView):
+    """
+    Monthly sales totals of the ofitsiant, read from the sales rollups.
+    """
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAdminOrOfitsiantUser]
+    serializer_class = None
+
+    def get(self, request, month, year):
+        try:
+            report = get_sales_report(year, month, request.user)
+        except ValueError:
+            return Response({"message": "Invalid month or year"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+
 # Apis for Users
 class UserInfoAPIView(APIView):
     """
     Handles requests related to user information.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = UserInfoSerializer
 
@@ -293,7 +438,7 @@ class UserRegistrationAPIView(APIView):
 
             user = serializer.save()
 
-            refresh = RefreshToken.for_user(user)
+            refresh = RoleRefreshToken.for_user(user)
 
             return Response({
                 "message": f"User created successfully {user.username}",
@@ -310,7 +455,7 @@ class UserInfoEditAPIView(APIView):
     
     HTTP Methods Allowed: PUT
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     @extend_schema(request=EditUserSerializer, responses=EditUserSerializer)
@@ -332,7 +477,7 @@ class UserDeleteAPIView(APIView):
     
     HTTP Methods Allowed: DELETE
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = None
 
@@ -357,44 +502,71 @@ class FoodListAPIView(APIView):
     """
     Handles requests to retrieve a list of foods.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = FoodListSerializer
 
     def get(self, request):
-        foods = Food.objects.all()
-        serializer = FoodListSerializer(foods, many=True)
-        return Response(serializer.data)
+        near = request.query_params.get('near')
+        if near:
+            return self.get_near(request, near)
+        foods = Food.objects.prefetch_related('image')
+        paginator = OldestFirstCursorPagination()
+        try:
+            foods = self.filter_by_price(request, foods)
+        except ValueError:
+            return Response({"message": "min_price and max_price must be numbers in so'm"}, status=status.HTTP_400_BAD_REQUEST)
+        page = paginator.paginate_queryset(foods, request, self)
+        if page is not None:
+            return paginator.get_paginated_response(FoodListSerializer(page, many=True).data)
+        if foods.query.where or foods.query.order_by:
+            return Response(FoodListSerializer(foods, many=True).data)
+        return self.get_cached(request)
+
+    def filter_by_price(self, request, foods):
+        return filter_foods_by_price(foods, request.query_params)
+
+    def get_cached(self, request):
+        version = get_menu_version()
+        etag = get_menu_etag(version)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(get_menu_bytes(version), content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get_near(self, request, near):
+        try:
+            lat, long, radius_km = parse_near(request.query_params)
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        foods = get_foods_near(lat, long, radius_km, Food.objects.prefetch_related('image'))
+        data = FoodListSerializer([food for food, _ in foods], many=True).data
+        for item, (_, distance) in zip(data, foods):
+            item['distance_km'] = round(distance, 3)
+        return Response(data)
 
 
 class RateFoodAPIView(APIView):
     """
     API view to rate a food item.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = None
 
     def put(self, request, id, rate):
+        if not 1 <= rate <= 5:
+            return Response({"message": "Rate must be between 1 and 5"}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            food = Food.objects.get(id=id)
-            user = request.user
-            try:
-                rate_item = food.ratings.get(user=user)
-                old_rate = rate_item.rate
-                obj = Rate.objects.get(id=rate_item.id)
-                obj.rate = rate
-                obj.save()
-                food.overal_rating = (food.overal_rating * food.overal_rated_users - old_rate + rate) / food.overal_rated_users
-                food.save()
-            except:
-                obj = Rate.objects.create(rate=rate, user=user)
-                food.ratings.add(obj)
-                food.overal_rating = (food.overal_rating * food.overal_rated_users + rate) / (food.overal_rated_users + 1)
-                food.overal_rated_users += 1
-                food.save()
-
-            serializer = FoodListSerializer(Food.objects.get(id=id))
+            if not Food.objects.filter(id=id).exists():
+                return Response({"message": "Food not found"}, status=status.HTTP_404_NOT_FOUND)
+            rate_food(id, request.user, rate)
+
+            serializer = FoodListSerializer(Food.objects.prefetch_related('image').get(id=id))
             return Response(serializer.data)
         except Exception as e:
             return Response({"message": f"Server error: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -404,17 +576,40 @@ class UserOrderCreateAPIView(APIView):
     """
     API endpoint for creating orders.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     @extend_schema(request=CreateUserOrderSerializer, responses=CreateUserOrderSerializer)
     def post(self, request):
         serializer = CreateUserOrderSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            estimate_date = serializer.save()
+            order = serializer.save()
+            publish_orders([order], 'created')
             response_data = {
                 'order': serializer.data,
-                'estimate_date': estimate_date
+                'estimate_date': order.estimate_date
+            }
+            return Response(response_data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class UserCartCreateAPIView(APIView):
+    """
+    API endpoint for ordering a whole cart with one delivery estimate.
+    """
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(request=CreateCartSerializer)
+    def post(self, request):
+        serializer = CreateCartSerializer(data=request.data, context={'request': request})
+        if serializer.is_valid():
+            orders = serializer.save()
+            publish_orders(orders, 'created')
+            response_data = {
+                'orders': CartOrderSerializer(orders, many=True).data,
+                'estimate_date': orders[0].estimate_date,
+                'ready_at': orders[0].ready_at,
             }
             return Response(response_data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -427,7 +622,11 @@ class UserOrdersAPIView(APIView):
     serializer_class = None
 
     def get(self, request):
-        queryset = Order.objects.filter(user=request.user)
+        queryset = Order.objects.filter(user=request.user).select_related('food').prefetch_related('food__image')
+        paginator = DateCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, self)
+        if page is not None:
+            return paginator.get_paginated_response(ListUserOrderSerializer(page, many=True).data)
         serializer = ListUserOrderSerializer(queryset, many=True)
         return Response(serializer.data)
 
@@ -441,8 +640,11 @@ class UserOrderDeleteAPIView(APIView):
     def delete(self, request, id):
         try:
             order = Order.objects.get(id=id, user=request.user)
-            order.delete()
-            change_estimates(order)
+            with transaction.atomic():
+                kitchen_scheduler.lock()
+                publish_orders([order], 'cancelled')
+                order.delete()
+                enqueue('recompute_estimates', key='recompute_estimates')
             return Response({"message": "Order deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
         except Order.DoesNotExist:
             return Response({"message": "Order not found"}, status=status.HTTP_404_NOT_FOUND)